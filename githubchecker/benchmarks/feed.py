@@ -0,0 +1,61 @@
+"""
+Replacement of the GitHub events feed that serves fixture files written by `benchmarks.generator`.
+"""
+import time
+from pathlib import Path
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+FIXTURE_FEED_URL = 'https://api.github.fixture/events'  # Served by FixtureFeedAdapter, never resolved
+
+
+class FixtureFeedAdapter(BaseAdapter):
+    """
+    Transport adapter of `requests` that answers requests of the events feed from fixture files.
+
+    Every request of the first page starts the next poll directory, and the other pages are served
+    from the current one, with the `ETag`, `Link`, `X-Poll-Interval` and rate limit headers of GitHub.
+    Nothing is sent over the network.
+
+    Usage:
+        poller = GHPoller('token', FIXTURE_FEED_URL)
+        poller._session.mount(FIXTURE_FEED_URL, FixtureFeedAdapter(Path('fixtures/feed')))
+    """
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.polls = sorted(path for path in directory.iterdir() if path.is_dir())
+        self.poll = -1
+
+    def send(self, request, **kwargs):
+        page = int(request.url.rsplit('page=', 1)[1].split('&')[0])
+        if page == 1:
+            self.poll += 1
+
+        response = Response()
+        response.request = request
+        response.url = request.url
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({
+            'X-Poll-Interval': '0',
+            'X-RateLimit-Limit': '5000',
+            'X-RateLimit-Remaining': '5000',
+            'X-RateLimit-Reset': str(int(time.time()) + 3600),
+        })
+        if self.poll >= len(self.polls):
+            # The fixtures are exhausted, the feed does not change anymore
+            response.status_code = 304
+            response._content = b''
+            return response
+
+        pages = sorted(self.polls[self.poll].glob('page-*.json'))
+        response.status_code = 200
+        response._content = pages[page - 1].read_bytes()
+        response.headers['ETag'] = f'"{self.polls[self.poll].name}"'
+        response.headers['Link'] = f'<{FIXTURE_FEED_URL}?per_page=100&page={len(pages)}>; rel="last"'
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,194 @@
+"""
+Synthetic GitHub event generator.
+
+Events have the shape of the GitHub events API (and of GH Archive lines), limited to the
+fields the parser reads. The generator is deterministic for a given seed, so fixture files
+generated on different machines or commits are identical.
+
+Usage (from the directory containing manage.py):
+    python -m benchmarks.generator fixtures/ --events 10000 [--repositories 1000] [--skew 1.1]
+                                   [--type-mix WatchEvent=5,PullRequestEvent=3,IssuesEvent=2]
+                                   [--span-hours 168] [--polls 20] [--seed 0]
+"""
+import argparse
+import gzip
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+
+DEFAULT_TYPE_MIX = {'WatchEvent': 5, 'PullRequestEvent': 3, 'IssuesEvent': 2}
+# The history ends at a fixed time, so that fixture files are identical on every machine
+DEFAULT_END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FEED_PAGE_SIZE = 100
+FEED_PAGES = 3
+ARCHIVE_FILE_SIZE = 1000000  # Events per GH Archive fixture file
+CHUNK_SIZE = 10000  # Events drawn from the random generator at once
+
+
+def parse_type_mix(value: str):
+    """
+    Parses a type mix argument such as `WatchEvent=5,PullRequestEvent=3`.
+
+    :param value: The comma-separated list of `type=weight` pairs.
+    :raises argparse.ArgumentTypeError: If the list is malformed.
+    :return: A dictionary mapping event types to their weights.
+    """
+    try:
+        type_mix = {name: float(weight) for name, weight in (pair.split('=') for pair in value.split(','))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid type mix: {value}. Usage: WatchEvent=5,PullRequestEvent=3')
+    if not type_mix or min(type_mix.values()) < 0 or not sum(type_mix.values()):
+        raise argparse.ArgumentTypeError(f'Invalid type mix: {value}. The weights have to be positive')
+    return type_mix
+
+
+def generate_events(count: int, start: datetime, end: datetime, repositories: int = 1000, skew: float = 1.1,
+                    type_mix=None, first_id: int = 1, seed: int = 0):
+    """
+    Yields synthetic GitHub events in chronological order.
+
+    The creation times are spread evenly from `start` to `end`. Repositories are drawn from a Zipf
+    distribution: the repository with ID `k` is chosen with a probability proportional to `1 / k ** skew`,
+    so a `skew` of 0 spreads the events uniformly and larger values concentrate them in a few repositories.
+
+    :param count: The number of events.
+    :param start: The creation time of the first event.
+    :param end: The creation time after the last event.
+    :param repositories: The number of repositories, with GitHub IDs from 1 to `repositories`.
+    :param skew: The Zipf exponent of the repository distribution.
+    :param type_mix: A dictionary mapping event types to their weights (defaults to `DEFAULT_TYPE_MIX`).
+    :param first_id: The ID of the first event; the following events have consecutive IDs.
+    :param seed: The seed of the random generator.
+    :return: A generator of GitHub API event dictionaries.
+    """
+    type_mix = type_mix or DEFAULT_TYPE_MIX
+    rng = random.Random(seed)
+    repository_ids = range(1, repositories + 1)
+    repository_weights = list(accumulate(1 / repository_id ** skew for repository_id in repository_ids))
+    event_types = list(type_mix)
+    type_weights = list(accumulate(type_mix.values()))
+    step = (end - start) / max(count, 1)
+
+    for chunk_start in range(0, count, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, count - chunk_start)
+        chunk_repositories = rng.choices(repository_ids, cum_weights=repository_weights, k=size)
+        chunk_types = rng.choices(event_types, cum_weights=type_weights, k=size)
+        for offset, (repository_id, event_type) in enumerate(zip(chunk_repositories, chunk_types)):
+            index = chunk_start + offset
+            yield {
+                'id': str(first_id + index),
+                'type': event_type,
+                'repo': {'id': repository_id, 'name': f'benchmark/repository-{repository_id}'},
+                'created_at': (start + step * index).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }
+
+
+def write_archive(directory: Path, events):
+    """
+    Writes events as gzipped NDJSON files in the GH Archive format.
+
+    :param directory: The directory of the files.
+    :param events: An iterable of GitHub API event dictionaries.
+    :return: A list of the paths of the written files.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    file = None
+    for index, event in enumerate(events):
+        if index % ARCHIVE_FILE_SIZE == 0:
+            if file is not None:
+                file.close()
+            paths.append(directory / f'events-{len(paths):04}.json.gz')
+            file = gzip.open(paths[-1], 'wt', encoding='utf-8')
+        file.write(json.dumps(event) + '\n')
+    if file is not None:
+        file.close()
+    return paths
+
+
+def write_feed(directory: Path, events):
+    """
+    Writes events as pages of the GitHub events feed, one directory of pages per poll.
+
+    Every poll returns the next `FEED_PAGE_SIZE * FEED_PAGES` events, newest first.
+
+    :param directory: The directory of the polls.
+    :param events: A list of GitHub API event dictionaries in chronological order.
+    :return: The number of written polls.
+    """
+    poll_size = FEED_PAGE_SIZE * FEED_PAGES
+    polls = 0
+    for poll_start in range(0, len(events), poll_size):
+        poll_directory = directory / f'poll-{polls:05}'
+        poll_directory.mkdir(parents=True, exist_ok=True)
+        poll_events = events[poll_start:poll_start + poll_size][::-1]
+        for page in range(0, len(poll_events), FEED_PAGE_SIZE):
+            page_path = poll_directory / f'page-{page // FEED_PAGE_SIZE + 1}.json'
+            page_path.write_text(json.dumps(poll_events[page:page + FEED_PAGE_SIZE]))
+        polls += 1
+    return polls
+
+
+def write_fixtures(directory: Path, events: int, repositories: int = 1000, skew: float = 1.1, type_mix=None,
+                   span_hours: int = 168, polls: int = 20, seed: int = 0, end: datetime = None):
+    """
+    Writes the fixtures of one data scale: the stored history and the live feed following it.
+
+    The history ends at `end` (defaults to `DEFAULT_END`) and is written in the GH Archive format
+    to `archive/`; the feed continues after `end` and is written to `feed/`. A `fixtures.json` file
+    records the parameters.
+
+    :param directory: The directory of the fixtures.
+    :param events: The number of history events.
+    :param repositories: The number of repositories.
+    :param skew: The Zipf exponent of the repository distribution.
+    :param type_mix: A dictionary mapping event types to their weights.
+    :param span_hours: The number of hours covered by the history.
+    :param polls: The number of feed polls.
+    :param seed: The seed of the random generator.
+    :param end: The end of the history.
+    :return: The parameters written to `fixtures.json`.
+    """
+    end = end or DEFAULT_END
+    start = end - timedelta(hours=span_hours)
+    arguments = {'repositories': repositories, 'skew': skew, 'type_mix': type_mix or DEFAULT_TYPE_MIX}
+
+    history = generate_events(events, start, end, seed=seed, **arguments)
+    write_archive(directory / 'archive', history)
+
+    feed_events = polls * FEED_PAGE_SIZE * FEED_PAGES
+    # The feed is as dense as the history
+    feed_end = end + (end - start) / max(events, 1) * feed_events
+    feed = generate_events(feed_events, end, feed_end, first_id=events + 1, seed=seed + 1, **arguments)
+    write_feed(directory / 'feed', list(feed))
+
+    parameters = {
+        'events': events, **arguments, 'span_hours': span_hours, 'polls': polls, 'seed': seed,
+        'end': end.isoformat(),
+    }
+    (directory / 'fixtures.json').write_text(json.dumps(parameters, indent=2))
+    return parameters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', type=Path, help='The directory of the fixtures.')
+    parser.add_argument('--events', type=int, default=10000, help='Number of history events (default: 10000).')
+    parser.add_argument('--repositories', type=int, default=1000, help='Number of repositories (default: 1000).')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of the repositories (default: 1.1).')
+    parser.add_argument('--type-mix', type=parse_type_mix, help='Weights of the event types.')
+    parser.add_argument('--span-hours', type=int, default=168, help='Hours covered by the history (default: 168).')
+    parser.add_argument('--polls', type=int, default=20, help='Number of feed polls (default: 20).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator (default: 0).')
+    args = parser.parse_args()
+
+    write_fixtures(
+        args.directory, args.events, repositories=args.repositories, skew=args.skew, type_mix=args.type_mix,
+        span_hours=args.span_hours, polls=args.polls, seed=args.seed
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Benchmark suite of the ingestion, the analytics and the chart rendering at several data scales.
+
+For every scale, synthetic fixtures are generated with `benchmarks.generator` (and reused by later
+runs with the same parameters) and loaded into a separate test database, which is created and
+destroyed by the suite. The suite measures:
+- the bulk ingestion throughput (GH Archive fixture files, as `import_gharchive` imports them),
+- the live ingestion throughput (`GHPoller.poll` against the fixture feed, no network),
+- the latency of `Analyzer.get_average_pull_request` and `Analyzer.get_number_of_events_groupped`,
+- the render time of `Visualizer.visualize_events_metrics`.
+The results are written as JSON together with the commit they were measured at.
+
+Usage (from the directory containing manage.py):
+    python -m benchmarks.run [--scales 10000 1000000 10000000] [--output results.json] [--repeat 20]
+                             [--fixtures-dir benchmarks/fixtures] [--batch-size 10000] [--keepdb]
+                             [--repositories 1000] [--skew 1.1] [--type-mix WatchEvent=5,...]
+                             [--span-hours 168] [--polls 20] [--seed 0]
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import django
+
+from .feed import FIXTURE_FEED_URL, FixtureFeedAdapter
+from .generator import DEFAULT_TYPE_MIX, parse_type_mix, write_fixtures
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARKS_DIR.parent
+
+DEFAULT_SCALES = (10000, 1000000, 10000000)
+EVENT_WINDOWS = (1, 60, 1440)  # Minutes
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def measure(function, repeat: int, setup=None):
+    """
+    Calls the function `repeat` times and returns statistics of the call durations.
+
+    :param function: The function to measure.
+    :param repeat: The number of calls.
+    :param setup: A function called before every call, which is not measured.
+    :return: A dictionary with the median, minimal and maximal duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': statistics.median(durations),
+        'min_ms': min(durations),
+        'max_ms': max(durations),
+    }
+
+
+def get_fixtures(fixtures_dir: Path, events: int, args):
+    """
+    Returns the fixture directory of a scale, generating the fixtures if they do not exist yet.
+
+    :param fixtures_dir: The directory of all fixtures.
+    :param events: The number of history events.
+    :param args: The parsed command line arguments with the generator parameters.
+    :return: The fixture directory.
+    """
+    parameters = {
+        'events': events, 'repositories': args.repositories, 'skew': args.skew,
+        'type_mix': args.type_mix or DEFAULT_TYPE_MIX, 'span_hours': args.span_hours, 'polls': args.polls,
+        'seed': args.seed,
+    }
+    digest = hashlib.md5(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:12]
+    directory = fixtures_dir / f'{events}-{digest}'
+    if not (directory / 'fixtures.json').exists():
+        print(f'Generating {events} events into {directory}...', flush=True)
+        write_fixtures(directory, **parameters)
+    return directory
+
+
+def reset_database():
+    """
+    Removes all data from the test database and from the caches of the parser and of Django.
+    """
+    from django.core.cache import cache
+    from django.core.management import call_command
+
+    from checker.ingestion import GHParser
+
+    call_command('flush', interactive=False, verbosity=0)
+    GHParser._repository_ids.clear()
+    GHParser._event_type_ids.clear()
+    GHParser._seen_event_ids.clear()
+    cache.clear()
+
+
+def benchmark_ingestion(directory: Path, batch_size: int):
+    """
+    Loads the history fixtures in batches and polls the fixture feed until it is exhausted.
+
+    :param directory: The fixture directory of the scale.
+    :param batch_size: The number of events saved per transaction of the bulk ingestion.
+    :return: A dictionary with the bulk and the live ingestion results.
+    """
+    from checker.ingestion import GHPoller
+    from checker.management.commands.import_gharchive import import_file
+
+    started = time.perf_counter()
+    saved = 0
+    for path in sorted((directory / 'archive').glob('*.json.gz')):
+        saved += import_file(str(path), batch_size)[2]
+    bulk_seconds = time.perf_counter() - started
+
+    adapter = FixtureFeedAdapter(directory / 'feed')
+    poll_durations = []
+    polled = 0
+    with GHPoller('benchmark', FIXTURE_FEED_URL) as poller:
+        poller._session.mount(FIXTURE_FEED_URL, adapter)
+        for _ in adapter.polls:
+            started = time.perf_counter()
+            polled += poller.poll()
+            poll_durations.append(time.perf_counter() - started)
+
+    return {
+        'bulk': {
+            'events': saved,
+            'seconds': bulk_seconds,
+            'events_per_second': saved / bulk_seconds if bulk_seconds else None,
+        },
+        'poll': {
+            'polls': len(poll_durations),
+            'events': polled,
+            'median_poll_ms': statistics.median(poll_durations) * 1000 if poll_durations else None,
+            'events_per_second': polled / sum(poll_durations) if poll_durations else None,
+        },
+    }
+
+
+def benchmark_analytics(repositories: int, repeat: int):
+    """
+    Measures the analytics and the chart rendering on the loaded data.
+
+    The current time is set to the creation time of the newest stored event, so that the time windows
+    cover the same events whenever the benchmark runs. The per-repository metrics are measured for the
+    most active repository (ID 1) and the least active one (ID `repositories`).
+
+    :param repositories: The number of repositories of the fixtures.
+    :param repeat: The number of measured calls per metric.
+    :return: A dictionary with the results.
+    """
+    from django.core.cache import cache
+    from django.db.models import Max
+
+    from checker.analytics import Analyzer
+    from checker.models import Event
+    from checker.visualization import Visualizer
+
+    now = Event.objects.aggregate(newest=Max('created_at'))['newest'] + timedelta(seconds=1)
+    results = {'average_pull_request': {}, 'events_groupped': {}, 'visualization': {}}
+
+    with mock.patch('django.utils.timezone.now', return_value=now):
+        for name, repository_id in (('top_repository', 1), ('tail_repository', repositories)):
+            results['average_pull_request'][name] = measure(
+                lambda: Analyzer.get_average_pull_request(repository_id), repeat
+            )
+
+        for offset in EVENT_WINDOWS:
+            results['events_groupped'][f'{offset}_minutes'] = measure(
+                lambda: Analyzer.get_number_of_events_groupped(offset), repeat
+            )
+
+        def visualize():
+            Visualizer.visualize_events_metrics(60)
+
+        results['visualization']['first'] = measure(visualize, 1, setup=cache.clear)
+        results['visualization']['cold'] = measure(visualize, repeat, setup=cache.clear)
+        results['visualization']['warm'] = measure(visualize, repeat)
+
+    return results
+
+
+def get_commit():
+    """
+    Returns the commit of the working tree, or None if it is not a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Numbers of history events (default: 10000 1000000 10000000).')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='The JSON file of the results (default: benchmark-results.json).')
+    parser.add_argument('--repeat', type=int, default=20, help='Measured calls per metric (default: 20).')
+    parser.add_argument('--fixtures-dir', type=Path, default=BENCHMARKS_DIR / 'fixtures',
+                        help='The directory of the generated fixtures (default: benchmarks/fixtures).')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='Events saved per transaction of the bulk ingestion (default: 10000).')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database after the run.')
+    parser.add_argument('--repositories', type=int, default=1000, help='Number of repositories (default: 1000).')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of the repositories (default: 1.1).')
+    parser.add_argument('--type-mix', type=parse_type_mix, help='Weights of the event types.')
+    parser.add_argument('--span-hours', type=int, default=168, help='Hours covered by the history (default: 168).')
+    parser.add_argument('--polls', type=int, default=20, help='Number of feed polls (default: 20).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator (default: 0).')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'githubchecker.settings')
+    django.setup()
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    results = {
+        'commit': get_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'fixtures_dir')},
+        'scales': {},
+    }
+
+    # All queries run on the test database, a configured read replica is not used
+    with override_settings(CACHES=LOCAL_CACHES, DATABASE_ROUTERS=[]):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+        try:
+            for events in args.scales:
+                directory = get_fixtures(args.fixtures_dir, events, args)
+                reset_database()
+                print(f'Benchmarking {events} events...', flush=True)
+                results['scales'][str(events)] = {
+                    'ingestion': benchmark_ingestion(directory, args.batch_size),
+                    **benchmark_analytics(args.repositories, args.repeat),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Startup benchmark of the project's entry points.
+
+Every entry point is imported in a fresh interpreter, which reports the time spent on
+setting Django up and importing the entry point, its peak RSS and which heavy libraries
+it has loaded. Heavy libraries have to be loaded on first use only, so loading one of
+them at startup is reported as a regression.
+
+Usage (from the directory containing manage.py):
+    python -m benchmarks.startup [--repeat N] [--output results.json]
+                                 [--max-import-ms MS] [--max-rss-mb MB]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ('matplotlib', 'numpy', 'requests')
+
+# name -> (statements importing the entry point, heavy modules it is allowed to load)
+ENTRY_POINTS = {
+    'django': ('', ()),
+    'web': ('import githubchecker.wsgi; import checker.urls', ()),
+    'analytics': ('import checker.analytics', ()),
+    'visualization': ('import checker.visualization', ()),
+    'ingestion': ('import checker.ingestion', ('requests', )),
+    'run_parser': ('import checker.management.commands.run_parser', ('requests', )),
+    'import_gharchive': ('import checker.management.commands.import_gharchive', ('requests', )),
+}
+
+MEASUREMENT = '''
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'githubchecker.settings')
+import django
+django.setup()
+{statements}
+elapsed = time.perf_counter() - started
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+max_rss_mb = max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10
+print(json.dumps({{
+    'import_ms': elapsed * 1000,
+    'max_rss_mb': max_rss_mb,
+    'heavy_modules': [name for name in {heavy_modules!r} if name in sys.modules],
+}}))
+'''
+
+
+def measure(statements: str):
+    """
+    Imports the entry point in a fresh interpreter and returns its measurement.
+
+    :param statements: The statements importing the entry point.
+    :return: A dictionary with 'import_ms', 'max_rss_mb' and 'heavy_modules'.
+    """
+    code = MEASUREMENT.format(statements=statements, heavy_modules=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_DIR, env=os.environ.copy(),
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per entry point (default: 5).')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--max-import-ms', type=float, help='Fail if a median import time exceeds this budget.')
+    parser.add_argument('--max-rss-mb', type=float, help='Fail if a median peak RSS exceeds this budget.')
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for name, (statements, allowed_modules) in ENTRY_POINTS.items():
+        runs = [measure(statements) for _ in range(args.repeat)]
+        result = {
+            'import_ms': statistics.median(run['import_ms'] for run in runs),
+            'max_rss_mb': statistics.median(run['max_rss_mb'] for run in runs),
+            'heavy_modules': runs[0]['heavy_modules'],
+        }
+        results[name] = result
+        print(f"{name:<18} {result['import_ms']:8.1f} ms {result['max_rss_mb']:8.1f} MB  "
+              f"{', '.join(result['heavy_modules']) or '-'}")
+
+        unexpected = set(result['heavy_modules']) - set(allowed_modules)
+        if unexpected:
+            failures.append(f'{name} loads {", ".join(sorted(unexpected))} at startup')
+        if args.max_import_ms is not None and result['import_ms'] > args.max_import_ms:
+            failures.append(f"{name} imports in {result['import_ms']:.1f} ms (budget {args.max_import_ms} ms)")
+        if args.max_rss_mb is not None and result['max_rss_mb'] > args.max_rss_mb:
+            failures.append(f"{name} uses {result['max_rss_mb']:.1f} MB (budget {args.max_rss_mb} MB)")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
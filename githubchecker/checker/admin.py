@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Repository, Event, EventType, PullRequestMetrics
+from .models import Repository, Event, EventHourlyAggregate, EventRollup, EventType, PullRequestStats
 
 
 class RepositoryAdmin(admin.ModelAdmin):
@@ -36,22 +36,48 @@ class EventAdmin(admin.ModelAdmin):
     Attributes:
     - list_display (tuple): The fields to be displayed in the admin list view.
     """
-    list_display = ('id', 'event_type', 'created_at', )
+    list_display = ('id', 'gh_event_id', 'event_type', 'created_at', )
 
 
-class PullRequestMetricsAdmin(admin.ModelAdmin):
+class EventRollupAdmin(admin.ModelAdmin):
     """
-    Admin class for the PullRequestMetrics model.
+    Admin class for the EventRollup model.
 
-    This class defines the admin interface configuration for the PullRequestMetrics model.
+    This class defines the admin interface configuration for the EventRollup model.
 
     Attributes:
     - list_display (tuple): The fields to be displayed in the admin list view.
     """
-    list_display = ('gh_repo_id', 'respond', )
+    list_display = ('minute', 'event_type', 'count', )
+
+
+class EventHourlyAggregateAdmin(admin.ModelAdmin):
+    """
+    Admin class for the EventHourlyAggregate model.
+
+    This class defines the admin interface configuration for the EventHourlyAggregate model.
+
+    Attributes:
+    - list_display (tuple): The fields to be displayed in the admin list view.
+    """
+    list_display = ('hour', 'repo', 'event_type', 'count', )
+
+
+class PullRequestStatsAdmin(admin.ModelAdmin):
+    """
+    Admin class for the PullRequestStats model.
+
+    This class defines the admin interface configuration for the PullRequestStats model.
+
+    Attributes:
+    - list_display (tuple): The fields to be displayed in the admin list view.
+    """
+    list_display = ('repo', 'count', 'first_at', 'last_at', )
 
 
 admin.site.register(Repository, RepositoryAdmin)
 admin.site.register(EventType, EventTypeAdmin)
 admin.site.register(Event, EventAdmin)
-admin.site.register(PullRequestMetrics, PullRequestMetricsAdmin)
+admin.site.register(EventRollup, EventRollupAdmin)
+admin.site.register(EventHourlyAggregate, EventHourlyAggregateAdmin)
+admin.site.register(PullRequestStats, PullRequestStatsAdmin)
@@ -0,0 +1,483 @@
+from datetime import timedelta
+from itertools import groupby, islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .ingest_state import RecentCounts
+from .instrumentation import REGISTRY, timed
+from .models import Event, EventHourlyAggregate, Repository, EventRollup
+from .routers import reads_from_replica
+
+ANALYTICS_SECONDS = REGISTRY.histogram(
+    'checker_analytics_seconds', 'Duration of the analytics queries.', ('method', )
+)
+
+
+class NotInDataBase(Exception):
+    """
+    Exception raised when an item is not found in the database.
+    """
+    pass
+
+
+class Analyzer:
+    """
+    The Analyzer class provides static(!) methods for analyzing events and calculating metrics.
+
+    Methods:
+    - get_average_pull_request(repository_id):
+        Retrieves the average time between pull request events for a specific repository.
+    - get_average_pull_requests(repository_ids):
+        Retrieves the average time between pull request events for several repositories in one query.
+    - get_pull_request_interval_stats(repository_id):
+        Retrieves the distribution of the times between pull request events for a specific repository.
+    - get_number_of_events_groupped(offset):
+        Retrieves the number of events grouped by event type within a specified time offset.
+    - get_events_time_series(start, end, bucket, repository_id=None):
+        Yields the number of events per event type for every time bucket within a time range.
+    - aget_average_pull_request, aget_average_pull_requests, aget_pull_request_interval_stats,
+      aget_number_of_events_groupped, aget_events_time_series:
+        Asynchronous versions of the methods above for async views.
+
+    Note: This class assumes the existence of appropriate database models (Repository, Event, EventType,
+    PullRequestStats) and their relationships.
+    Note: The queries may be served by the read replica (see `checker.routers`).
+    Note: This class does not need to be instantiated, as all its methods are static.
+    """
+
+    INTERVAL_STATS_CHUNK_SIZE = 10000
+    TIME_SERIES_BUCKETS = ('minute', 'hour', 'day')
+    TIME_SERIES_CHUNK_SIZE = 2000
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='get_average_pull_request')
+    @reads_from_replica
+    def get_average_pull_request(repository_id: int):
+        """
+        Retrieves the average time between pull request events for a specific repository.
+
+        This method reads the repository together with its running pull request statistics, which are
+        maintained on ingest, in one query and computes the average from them, so it neither depends on the
+        number of stored events nor writes to the database.
+        It returns the average time in the format 'X days, HH:MM:SS'.
+
+        :param repository_id: The ID of the repository.
+        :return: The average time between pull request events as a formatted string,
+                 or an error message if the `repository` does not exist in the database.
+        """
+        try:
+            repository = Analyzer.__get_repository(repository_id)
+        except NotInDataBase as e:
+            return e
+
+        return Analyzer.__average_pull_request(repository)
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='aget_average_pull_request')
+    @reads_from_replica
+    async def aget_average_pull_request(repository_id: int):
+        """
+        Asynchronous version of `get_average_pull_request`.
+
+        :param repository_id: The ID of the repository.
+        :return: The average time between pull request events as a formatted string,
+                 or an error message if the `repository` does not exist in the database.
+        """
+        try:
+            repository = await Analyzer.__aget_repository(repository_id)
+        except NotInDataBase as e:
+            return e
+
+        return Analyzer.__average_pull_request(repository)
+
+    @staticmethod
+    def __average_pull_request(repository):
+        """
+        Returns the average time between pull request events of a repository read by `__get_repository`.
+
+        :param repository: The repository object with its pull request statistics.
+        :return: The average time as a formatted string.
+        """
+        stats = getattr(repository, 'pull_request_stats', None)
+        if stats is None or stats.count < 2:
+            # Difference between one(1)/zero(0) datetime(-s) is zero(0)
+            return '0 days, 00:00:00'
+        return Analyzer.__format_timedelta(stats.average_interval())
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='get_average_pull_requests')
+    @reads_from_replica
+    def get_average_pull_requests(repository_ids):
+        """
+        Retrieves the average time between pull request events for several repositories in one query.
+
+        The average interval between the pull request events of a repository is the time between its first
+        and its last pull request event divided by the number of intervals, so it is computed by the database
+        from the running pull request statistics of all requested repositories in a single grouped query,
+        regardless of the number of repositories and stored events.
+        It returns the average times in the format 'X days, HH:MM:SS'.
+
+        :param repository_ids: The IDs of the repositories.
+        :return: A dictionary mapping every requested repository ID to the average time between its pull
+                 request events as a formatted string, or to an error message if the `repository`
+                 does not exist in the database.
+        """
+        averages = Analyzer.__average_pull_requests_query(repository_ids)
+        return Analyzer.__format_average_pull_requests(repository_ids, averages)
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='aget_average_pull_requests')
+    @reads_from_replica
+    async def aget_average_pull_requests(repository_ids):
+        """
+        Asynchronous version of `get_average_pull_requests`.
+
+        :param repository_ids: The IDs of the repositories.
+        :return: A dictionary mapping every requested repository ID to the average time between its pull
+                 request events as a formatted string, or to an error message if the `repository`
+                 does not exist in the database.
+        """
+        averages = [row async for row in Analyzer.__average_pull_requests_query(repository_ids)]
+        return Analyzer.__format_average_pull_requests(repository_ids, averages)
+
+    @staticmethod
+    def __average_pull_requests_query(repository_ids):
+        """
+        Builds the query computing the average time between pull request events of the repositories.
+
+        :param repository_ids: The IDs of the repositories.
+        :return: A queryset of (repository ID, average interval) tuples of the existing repositories.
+        """
+        average_interval = Case(
+            When(
+                pull_request_stats__count__gt=1,
+                then=ExpressionWrapper(
+                    (F('pull_request_stats__last_at') - F('pull_request_stats__first_at'))
+                    / (F('pull_request_stats__count') - 1),
+                    output_field=DurationField()
+                )
+            ),
+            default=Value(timedelta(0)),
+            output_field=DurationField()
+        )
+        return Repository.objects.filter(gh_repo_id__in=repository_ids) \
+            .annotate(average_interval=average_interval) \
+            .values_list('gh_repo_id', 'average_interval')
+
+    @staticmethod
+    def __format_average_pull_requests(repository_ids, averages):
+        """
+        Formats the average times of the repositories, reporting the repositories missing from `averages`.
+
+        :param repository_ids: The IDs of the requested repositories.
+        :param averages: An iterable of (repository ID, average interval) tuples.
+        :return: A dictionary mapping every requested repository ID to the formatted average time or an error message.
+        """
+        formatted_averages = {
+            repository_id: Analyzer.__format_timedelta(average) for repository_id, average in averages
+        }
+
+        return {
+            repository_id: formatted_averages.get(repository_id, 'No existing repository')
+            for repository_id in repository_ids
+        }
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='get_pull_request_interval_stats')
+    @reads_from_replica
+    def get_pull_request_interval_stats(repository_id: int):
+        """
+        Retrieves the distribution of the times between pull request events for a specific repository.
+
+        The creation times of the pull request events are streamed in ascending order from a server-side cursor
+        and converted chunk by chunk into `datetime64` arrays, without building model instances. Only the
+        intervals between consecutive events are kept (one float per event) to compute the statistics with NumPy.
+        It returns the times in the format 'X days, HH:MM:SS'.
+
+        :param repository_id: The ID of the repository.
+        :return: A dictionary with the number of intervals and their mean, median, p90, p99, stddev, min and max,
+                 or an error message if the `repository` does not exist in the database.
+        """
+        import numpy as np
+
+        try:
+            repository = Analyzer.__get_repository(repository_id)
+        except NotInDataBase as e:
+            return str(e)
+
+        created_at = Event.objects \
+            .filter(repo=repository, event_type__event_type='PullRequestEvent') \
+            .order_by('created_at') \
+            .values_list('created_at', flat=True) \
+            .iterator(chunk_size=Analyzer.INTERVAL_STATS_CHUNK_SIZE)
+
+        intervals = []
+        previous = None
+        while True:
+            chunk = np.fromiter(
+                (value.replace(tzinfo=None) for value in islice(created_at, Analyzer.INTERVAL_STATS_CHUNK_SIZE)),
+                dtype='datetime64[us]'
+            )
+            if not chunk.size:
+                break
+            if previous is not None:
+                chunk = np.concatenate((previous, chunk))
+            intervals.append(np.diff(chunk) / np.timedelta64(1, 's'))
+            previous = chunk[-1:]
+
+        intervals = np.concatenate(intervals) if intervals else np.empty(0)
+        count = intervals.size
+        if not count:
+            # Difference between one(1)/zero(0) datetime(-s) is zero(0)
+            intervals = np.zeros(1)
+
+        median, p90, p99 = np.percentile(intervals, (50, 90, 99))
+        stats = {
+            'mean': intervals.mean(),
+            'median': median,
+            'p90': p90,
+            'p99': p99,
+            'stddev': intervals.std(ddof=1) if count > 1 else 0,
+            'min': intervals.min(),
+            'max': intervals.max(),
+        }
+        stats = {name: Analyzer.__format_timedelta(timedelta(seconds=float(value))) for name, value in stats.items()}
+
+        return {'count': count, **stats}
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='aget_pull_request_interval_stats')
+    @reads_from_replica
+    async def aget_pull_request_interval_stats(repository_id: int):
+        """
+        Asynchronous version of `get_pull_request_interval_stats`.
+
+        Streaming the creation times and computing the statistics runs in a worker thread,
+        so the event loop is not blocked by the NumPy work.
+
+        :param repository_id: The ID of the repository.
+        :return: A dictionary with the number of intervals and their mean, median, p90, p99, stddev, min and max,
+                 or an error message if the `repository` does not exist in the database.
+        """
+        return await sync_to_async(Analyzer.get_pull_request_interval_stats)(repository_id)
+
+    @staticmethod
+    def __format_timedelta(timedelta_obj):
+        """
+        Formats a timedelta object into a string representation.
+
+        This method takes a timedelta object and formats it into a string representation in the format
+        'X days, HH:MM:SS'.
+
+        :param timedelta_obj: The timedelta object to format.
+        :return: The formatted string representation of the timedelta.
+        """
+        days = timedelta_obj.days
+        hours, remainder = divmod(timedelta_obj.seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f'{days} days, {hours:02}:{minutes:02}:{seconds:02}'
+
+    @staticmethod
+    def __get_repository(repository_id: int):
+        """
+        Retrieves a repository object from the database based on the repository ID.
+
+        This method retrieves the repository object from the database that matches the provided repository ID,
+        together with its pull request statistics (if they exist).
+
+        :param repository_id: The ID of the repository to retrieve.
+        :raises NotInDataBase: If no repository with the provided ID exists in the database.
+        :return: The repository object if found.
+        """
+        try:
+            return Repository.objects.select_related('pull_request_stats') \
+                .get(gh_repo_id=repository_id)
+        except Repository.DoesNotExist:
+            raise NotInDataBase('No existing repository')
+
+    @staticmethod
+    async def __aget_repository(repository_id: int):
+        """
+        Asynchronous version of `__get_repository`.
+
+        :param repository_id: The ID of the repository to retrieve.
+        :raises NotInDataBase: If no repository with the provided ID exists in the database.
+        :return: The repository object if found.
+        """
+        try:
+            return await Repository.objects.select_related('pull_request_stats') \
+                .aget(gh_repo_id=repository_id)
+        except Repository.DoesNotExist:
+            raise NotInDataBase('No existing repository')
+
+    @staticmethod
+    def __merge_dictionaries(array_of_dicts):
+        """
+        Merges multiple dictionaries into one.
+
+        This method takes as input a list of dictionaries, each of which contains the keys
+        'event_type__event_type' and 'count'. It creates a new dictionary where each key is
+        the value of 'event_type__event_type' and each value is the sum of the corresponding 'count's.
+
+        :param array_of_dicts: List of dictionaries to be merged.
+        :return: Merged dictionary where keys are event types and values are counts.
+        """
+        merged = {}
+        for dictionary in array_of_dicts:
+            event_type = dictionary['event_type__event_type']
+            merged[event_type] = merged.get(event_type, 0) + dictionary['count']
+        return merged
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='get_number_of_events_groupped')
+    @reads_from_replica
+    def get_number_of_events_groupped(offset):
+        """
+        Retrieves the number of events grouped by event type within a specified time offset.
+
+        This method takes an offset parameter, which represents the number of minutes to consider
+        for fetching the events. It sums the per-minute counts of the minutes within the time offset
+        from the current datetime (including the minute the offset starts in). Recent windows are
+        answered from the `RecentCounts` snapshot published by the parser; otherwise at most
+        `offset + 1` rollup rows per event type are read. It returns a dictionary with event types
+        as keys and their corresponding counts as values.
+
+        :param offset: The time offset in minutes to consider for fetching the events.
+        :return: A dictionary where keys are event types and values are the counts of events.
+        """
+        current_time, time_threshold = Analyzer.__time_window(offset)
+
+        recent_counts = RecentCounts.count_since(time_threshold, current_time)
+        if recent_counts is not None:
+            return recent_counts
+
+        event_counts = Analyzer.__event_counts_query(current_time, time_threshold)
+
+        return Analyzer.__merge_dictionaries(event_counts)
+
+    @staticmethod
+    @timed(ANALYTICS_SECONDS, method='aget_number_of_events_groupped')
+    @reads_from_replica
+    async def aget_number_of_events_groupped(offset):
+        """
+        Asynchronous version of `get_number_of_events_groupped`.
+
+        :param offset: The time offset in minutes to consider for fetching the events.
+        :return: A dictionary where keys are event types and values are the counts of events.
+        """
+        current_time, time_threshold = Analyzer.__time_window(offset)
+
+        recent_counts = await RecentCounts.acount_since(time_threshold, current_time)
+        if recent_counts is not None:
+            return recent_counts
+
+        event_counts = [row async for row in Analyzer.__event_counts_query(current_time, time_threshold)]
+
+        return Analyzer.__merge_dictionaries(event_counts)
+
+    @staticmethod
+    def __time_window(offset):
+        """
+        Returns the current datetime and the start of the minute `offset` minutes ago.
+
+        :param offset: The time offset in minutes.
+        :return: A tuple of the current datetime and the time threshold.
+        """
+        current_time = timezone.now()
+        return current_time, (current_time - timedelta(minutes=offset)).replace(second=0, microsecond=0)
+
+    @staticmethod
+    def __event_counts_query(current_time, time_threshold):
+        """
+        Builds the query summing the per-minute rollups of the time window by event type.
+
+        :param current_time: The end of the time window.
+        :param time_threshold: The start of the time window.
+        :return: A queryset of dictionaries with the keys 'event_type__event_type' and 'count'.
+        """
+        rollups = EventRollup.objects.filter(minute__lte=current_time, minute__gte=time_threshold)
+        return rollups.values('event_type__event_type').annotate(count=Sum('count'))
+
+    @staticmethod
+    @reads_from_replica
+    def get_events_time_series(start, end, bucket: str, repository_id: int = None):
+        """
+        Yields the number of events per event type for every time bucket within a time range.
+
+        The events are bucketed by truncating their creation time in the database and counted per bucket and
+        event type with one grouped query, whose rows are streamed from a server-side cursor in bucket order.
+        Without a repository the per-minute rollups are summed instead of counting the events. For a repository
+        the hourly aggregates of downsampled events are added, so time ranges older than the retention period
+        are counted at hourly resolution. Buckets without events are omitted.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param bucket: The bucket size, one of `TIME_SERIES_BUCKETS`.
+        :param repository_id: The ID of the repository whose events are counted, or None for all repositories.
+        :return: A generator of dictionaries with the 'bucket' start time and the 'counts' of the event types.
+        """
+        rows = Analyzer.__events_time_series_query(start, end, bucket, repository_id) \
+            .iterator(chunk_size=Analyzer.TIME_SERIES_CHUNK_SIZE)
+
+        for bucket_start, bucket_rows in groupby(rows, key=lambda row: row['bucket']):
+            yield {'bucket': bucket_start, 'counts': Analyzer.__merge_dictionaries(bucket_rows)}
+
+    @staticmethod
+    @reads_from_replica
+    async def aget_events_time_series(start, end, bucket: str, repository_id: int = None):
+        """
+        Asynchronous version of `get_events_time_series`.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param bucket: The bucket size, one of `TIME_SERIES_BUCKETS`.
+        :param repository_id: The ID of the repository whose events are counted, or None for all repositories.
+        :return: An asynchronous generator of dictionaries with the 'bucket' start time and the 'counts'
+                 of the event types.
+        """
+        rows = Analyzer.__events_time_series_query(start, end, bucket, repository_id) \
+            .aiterator(chunk_size=Analyzer.TIME_SERIES_CHUNK_SIZE)
+
+        bucket_start, bucket_rows = None, []
+        async for row in rows:
+            if bucket_rows and row['bucket'] != bucket_start:
+                yield {'bucket': bucket_start, 'counts': Analyzer.__merge_dictionaries(bucket_rows)}
+                bucket_rows = []
+            bucket_start = row['bucket']
+            bucket_rows.append(row)
+        if bucket_rows:
+            yield {'bucket': bucket_start, 'counts': Analyzer.__merge_dictionaries(bucket_rows)}
+
+    @staticmethod
+    def __events_time_series_query(start, end, bucket: str, repository_id: int = None):
+        """
+        Builds the query counting the events per time bucket and event type, ordered by bucket.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param bucket: The bucket size, one of `TIME_SERIES_BUCKETS`.
+        :param repository_id: The ID of the repository whose events are counted, or None for all repositories.
+        :return: A queryset of dictionaries with the keys 'bucket', 'event_type__event_type' and 'count'
+                 (for a repository, a bucket may have one row per event type from the events and one from
+                 the hourly aggregates).
+        """
+        if repository_id is None:
+            rows = EventRollup.objects.filter(minute__gte=start, minute__lt=end) \
+                .annotate(bucket=Trunc('minute', bucket)) \
+                .values('bucket', 'event_type__event_type') \
+                .annotate(count=Sum('count'))
+        else:
+            rows = Event.objects.filter(repo__gh_repo_id=repository_id, created_at__gte=start, created_at__lt=end) \
+                .annotate(bucket=Trunc('created_at', bucket)) \
+                .values('bucket', 'event_type__event_type') \
+                .annotate(count=Count('id'))
+            aggregates = EventHourlyAggregate.objects \
+                .filter(repo__gh_repo_id=repository_id, hour__gte=start, hour__lt=end) \
+                .annotate(bucket=Trunc('hour', bucket)) \
+                .values('bucket', 'event_type__event_type') \
+                .annotate(count=Sum('count'))
+            rows = rows.union(aggregates, all=True)
+        return rows.order_by('bucket')
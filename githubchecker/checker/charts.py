@@ -0,0 +1,46 @@
+from io import BytesIO
+
+BAR_COLOR = '#2E6DFF'
+SUMMARIZED_COLOR = '#719DFF'
+
+# Figure sizes in inches and resolutions in dots per inch
+FIGURE_SIZE = (6.4, 4.8)
+DPI = 100
+SMALL_DPI = 50
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def render_bar_chart(title: str, names, values, image_format: str = 'png', small: bool = False):
+    """
+    Renders a bar chart and returns the encoded image.
+
+    The chart is drawn on its own `Figure` instead of the global `pyplot` state, so charts can be
+    rendered concurrently. The last bar is highlighted (it shows the summarized value).
+    This function does not depend on Django, so it can run in a separate worker process.
+
+    :param title: The title of the chart.
+    :param names: The labels of the bars.
+    :param values: The heights of the bars.
+    :param image_format: The image format, 'png' or 'svg'.
+    :param small: Whether to render a smaller, low resolution PNG.
+    :return: The bytes of the encoded image.
+    """
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+    axes = figure.subplots()
+    axes.set_title(title)
+    bars = axes.bar(range(len(values)), values, tick_label=names, color=BAR_COLOR)
+    for bar in bars:
+        yval = bar.get_height()
+        axes.text(bar.get_x() + bar.get_width() / 2, yval, int(yval), va='bottom', ha='center')
+    if bars:
+        bars[-1].set_color(SUMMARIZED_COLOR)
+
+    buf = BytesIO()
+    figure.savefig(buf, format=image_format, dpi=SMALL_DPI if small else DPI)
+    return buf.getvalue()
@@ -0,0 +1,123 @@
+import csv
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+
+from .models import Event
+from .routers import reads_from_replica
+
+
+class EventExport:
+    """
+    The EventExport class streams stored events as CSV or NDJSON.
+
+    Events are read through a server-side cursor (on PostgreSQL) in chunks of `CHUNK_SIZE` rows and
+    every chunk is encoded into one string, so the memory used by an export does not depend on its size.
+    The cursor is read within one transaction, so an export is a consistent snapshot of the events and
+    PostgreSQL does not have to materialize the whole result for a cursor outliving a transaction.
+    Exports may be served by the read replica (see `checker.routers`).
+
+    Methods:
+    - chunks(start, end, output_format, repository_id, chunk_size):
+        Yields the export of the events created within the time range as encoded chunks.
+    - achunks(start, end, output_format, repository_id, chunk_size):
+        Asynchronous version of `chunks`.
+
+    Note: This class does not need to be instantiated, as all its methods are static.
+    """
+    CHUNK_SIZE = 5000
+    FIELDS = ('id', 'type', 'repo_id', 'repo_name', 'created_at')
+    CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+    @staticmethod
+    @reads_from_replica
+    def chunks(start, end, output_format: str = 'csv', repository_id: int = None, chunk_size: int = CHUNK_SIZE):
+        """
+        Yields the export of the events created within the time range as encoded chunks.
+
+        Every event is exported with its GitHub ID, its event type, the GitHub ID and the name of its
+        repository and its creation time, ordered by the creation time. A CSV export starts with a header.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param output_format: 'csv' or 'ndjson'.
+        :param repository_id: The GitHub ID of the repository to export the events of, or None for all.
+        :param chunk_size: The number of rows fetched from the cursor and encoded at once.
+        :return: A generator of strings.
+        """
+        if output_format == 'csv':
+            encode = EventExport.__encode_csv
+            buffer = StringIO()
+            csv.writer(buffer).writerow(EventExport.FIELDS)
+            yield buffer.getvalue()
+        else:
+            encode = EventExport.__encode_ndjson
+
+        using = router.db_for_read(Event)
+        with transaction.atomic(using=using):
+            chunk = []
+            rows = EventExport.__query(start, end, repository_id).using(using).iterator(chunk_size=chunk_size)
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield encode(chunk)
+                    chunk = []
+            if chunk:
+                yield encode(chunk)
+
+    @staticmethod
+    async def achunks(start, end, output_format: str = 'csv', repository_id: int = None,
+                      chunk_size: int = CHUNK_SIZE):
+        """
+        Asynchronous version of `chunks`.
+
+        The chunks are produced by `chunks` in the thread that holds the database connection of the
+        request (like the async ORM does), so the cursor and its transaction stay on one connection.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param output_format: 'csv' or 'ndjson'.
+        :param repository_id: The GitHub ID of the repository to export the events of, or None for all.
+        :param chunk_size: The number of rows fetched from the cursor and encoded at once.
+        :return: An asynchronous generator of strings.
+        """
+        chunks = EventExport.chunks(start, end, output_format, repository_id, chunk_size)
+        next_chunk = sync_to_async(next, thread_sensitive=True)
+        try:
+            while (chunk := await next_chunk(chunks, None)) is not None:
+                yield chunk
+        finally:
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+
+    @staticmethod
+    def __query(start, end, repository_id: int = None):
+        """
+        Private helper method that builds the query of the exported rows.
+
+        :param start: The start of the time range (inclusive).
+        :param end: The end of the time range (exclusive).
+        :param repository_id: The GitHub ID of the repository, or None for all repositories.
+        :return: QuerySet of tuples in the order of `FIELDS`.
+        """
+        events = Event.objects.filter(created_at__gte=start, created_at__lt=end)
+        if repository_id is not None:
+            events = events.filter(repo__gh_repo_id=repository_id)
+        return events.order_by('created_at').values_list(
+            'gh_event_id', 'event_type__event_type', 'repo__gh_repo_id', 'repo__name', 'created_at'
+        )
+
+    @staticmethod
+    def __encode_csv(rows):
+        buffer = StringIO()
+        csv.writer(buffer).writerows(
+            (gh_event_id, event_type, repo_id, repo_name, created_at.isoformat())
+            for gh_event_id, event_type, repo_id, repo_name, created_at in rows
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def __encode_ndjson(rows):
+        encoder = DjangoJSONEncoder()
+        return ''.join(encoder.encode(dict(zip(EventExport.FIELDS, row))) + '\n' for row in rows)
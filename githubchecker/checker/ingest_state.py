@@ -0,0 +1,237 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import EventRollup
+
+
+class RecentCounts:
+    """
+    A ring buffer of per-minute event counts by event type covering the last `hours` hours.
+
+    The parser fills the buffer while it saves events and publishes it through Django's cache
+    framework, so all web workers can answer time window counts of recent minutes without a query.
+    Other processes that save recent events (e.g. `import_gharchive`) invalidate the snapshot, and the
+    parser then reloads its buffer from the rollups before it publishes it again.
+
+    Methods:
+    - from_database(hours):
+        Creates a buffer filled from the per-minute rollups of the last `hours` hours.
+    - add(minute, event_type, count):
+        Adds events created within the minute to the buffer.
+    - publish():
+        Stores a snapshot of the buffer in the cache.
+    - is_invalidated():
+        Checks whether the snapshot has been invalidated since the buffer was created.
+    - invalidate(newest):
+        Removes the snapshot if events created within the last `settings.RECENT_COUNTS_HOURS` hours
+        were saved without the buffer.
+    - count_since(time_threshold, current_time):
+        Returns counts by event type from the published snapshot, or None if the snapshot does not
+        cover the time window.
+    - acount_since(time_threshold, current_time):
+        Asynchronous version of `count_since`.
+    """
+    CACHE_KEY = 'checker:recent-counts'
+    INVALIDATED_KEY = 'checker:recent-counts:invalidated-at'
+    MAX_SNAPSHOT_AGE = timedelta(minutes=5)  # Older snapshots are ignored, e.g. when the parser is stopped
+
+    def __init__(self, hours: int):
+        """
+        :param hours: The number of hours covered by the buffer.
+        """
+        self.hours = hours
+        self.size = hours * 60
+        self.created_at = time.time()
+        self._minutes = [None] * self.size
+        self._counts = [None] * self.size
+
+    @classmethod
+    def from_database(cls, hours: int):
+        """
+        Creates a buffer filled from the per-minute rollups of the last `hours` hours.
+
+        :param hours: The number of hours covered by the buffer.
+        :return: The filled `RecentCounts` instance.
+        """
+        recent_counts = cls(hours)
+        rollups = EventRollup.objects.filter(minute__gte=recent_counts._start(timezone.now())) \
+            .values_list('minute', 'event_type__event_type', 'count')
+        for minute, event_type, count in rollups:
+            recent_counts.add(minute, event_type, count)
+        return recent_counts
+
+    def add(self, minute, event_type: str, count: int = 1):
+        """
+        Adds events created within the minute to the buffer. Events older than the buffer are ignored.
+
+        :param minute: The creation time of the events.
+        :param event_type: The name of the event type.
+        :param count: The number of events.
+        :return: None
+        """
+        epoch_minute = int(minute.timestamp()) // 60
+        index = epoch_minute % self.size
+        if self._minutes[index] != epoch_minute:
+            if self._minutes[index] is not None and self._minutes[index] > epoch_minute:
+                return
+            self._minutes[index] = epoch_minute
+            self._counts[index] = {}
+        self._counts[index][event_type] = self._counts[index].get(event_type, 0) + count
+
+    def publish(self):
+        """
+        Stores a snapshot of the buffer in the cache.
+
+        The snapshot maps epoch minutes to counts by event type and records the time window it covers.
+
+        :return: None
+        """
+        current_time = timezone.now()
+        start = int(self._start(current_time).timestamp()) // 60
+        snapshot = {
+            'since': start,
+            'published_at': current_time,
+            'minutes': {
+                minute: counts for minute, counts in zip(self._minutes, self._counts)
+                if minute is not None and minute >= start
+            },
+        }
+        cache.set(self.CACHE_KEY, snapshot, timeout=int(self.MAX_SNAPSHOT_AGE.total_seconds()))
+
+    def is_invalidated(self):
+        """
+        Checks whether the snapshot has been invalidated since the buffer was created.
+
+        :return: True if the buffer misses events saved by another process.
+        """
+        invalidated_at = cache.get(self.INVALIDATED_KEY)
+        return invalidated_at is not None and invalidated_at >= self.created_at
+
+    @classmethod
+    def invalidate(cls, newest):
+        """
+        Removes the snapshot if events created within the last `settings.RECENT_COUNTS_HOURS` hours
+        were saved without the buffer, until the parser has reloaded its buffer.
+
+        :param newest: The creation time of the newest saved event.
+        :return: None
+        """
+        if newest < timezone.now() - timedelta(hours=settings.RECENT_COUNTS_HOURS):
+            return
+        cache.set(cls.INVALIDATED_KEY, time.time(), timeout=None)
+        cache.delete(cls.CACHE_KEY)
+
+    @classmethod
+    def count_since(cls, time_threshold, current_time):
+        """
+        Returns counts by event type of the minutes from `time_threshold` to `current_time`.
+
+        :param time_threshold: The start of the time window.
+        :param current_time: The end of the time window.
+        :return: A dictionary where keys are event types and values are the counts of events,
+                 or None if there is no recent snapshot covering the time window.
+        """
+        return cls._count_snapshot(cache.get(cls.CACHE_KEY), time_threshold, current_time)
+
+    @classmethod
+    async def acount_since(cls, time_threshold, current_time):
+        """
+        Asynchronous version of `count_since`.
+
+        :param time_threshold: The start of the time window.
+        :param current_time: The end of the time window.
+        :return: A dictionary where keys are event types and values are the counts of events,
+                 or None if there is no recent snapshot covering the time window.
+        """
+        return cls._count_snapshot(await cache.aget(cls.CACHE_KEY), time_threshold, current_time)
+
+    @classmethod
+    def _count_snapshot(cls, snapshot, time_threshold, current_time):
+        if snapshot is None or current_time - snapshot['published_at'] > cls.MAX_SNAPSHOT_AGE:
+            return None
+        first_minute = int(time_threshold.timestamp()) // 60
+        if first_minute < snapshot['since']:
+            return None
+
+        last_minute = int(current_time.timestamp()) // 60
+        counts = defaultdict(int)
+        for minute, minute_counts in snapshot['minutes'].items():
+            if first_minute <= minute <= last_minute:
+                for event_type, count in minute_counts.items():
+                    counts[event_type] += count
+        return dict(counts)
+
+    def _start(self, current_time):
+        return (current_time - timedelta(minutes=self.size - 1)).replace(second=0, microsecond=0)
+
+
+class IngestWatermark:
+    """
+    The IngestWatermark class publishes when events were last ingested, overall and per repository.
+
+    The parser publishes the watermark through Django's cache framework after every batch that saved
+    new events. Responses of the metrics endpoints can only change when a watermark moves, so the
+    views derive HTTP validators and response cache keys from it.
+
+    Methods:
+    - publish(gh_repository_ids):
+        Sets the overall watermark and the watermarks of the given repositories to the current time.
+    - get():
+        Returns the overall watermark as a UNIX timestamp, or None if it is unknown.
+    - get_for_repository(gh_repository_id):
+        Returns the watermark of the repository as a UNIX timestamp, falling back to the overall watermark.
+    - aget(), aget_for_repository(gh_repository_id):
+        Asynchronous versions of `get` and `get_for_repository`.
+
+    Note: The watermarks of the repositories expire after `REPOSITORY_TIMEOUT` seconds without new events,
+    so the cache does not keep a key for every repository ever seen. The overall watermark is used for
+    a repository without a watermark instead, as it is never older than the watermark of any repository.
+    Note: This class does not need to be instantiated, as all its methods are static.
+    """
+    CACHE_KEY = 'checker:watermark'
+    REPOSITORY_TIMEOUT = 60 * 60  # Seconds
+
+    @staticmethod
+    def publish(gh_repository_ids):
+        """
+        Sets the overall watermark and the watermarks of the given repositories to the current time.
+
+        :param gh_repository_ids: GitHub IDs of the repositories that received new events.
+        :return: None
+        """
+        watermark = time.time()
+        cache.set_many(
+            {IngestWatermark._repository_key(repo_id): watermark for repo_id in gh_repository_ids},
+            timeout=IngestWatermark.REPOSITORY_TIMEOUT
+        )
+        cache.set(IngestWatermark.CACHE_KEY, watermark, timeout=None)
+
+    @staticmethod
+    def get():
+        return cache.get(IngestWatermark.CACHE_KEY)
+
+    @staticmethod
+    def get_for_repository(gh_repository_id: int):
+        repository_key = IngestWatermark._repository_key(gh_repository_id)
+        watermarks = cache.get_many([repository_key, IngestWatermark.CACHE_KEY])
+        return watermarks.get(repository_key, watermarks.get(IngestWatermark.CACHE_KEY))
+
+    @staticmethod
+    async def aget():
+        return await cache.aget(IngestWatermark.CACHE_KEY)
+
+    @staticmethod
+    async def aget_for_repository(gh_repository_id: int):
+        repository_key = IngestWatermark._repository_key(gh_repository_id)
+        watermarks = await cache.aget_many([repository_key, IngestWatermark.CACHE_KEY])
+        return watermarks.get(repository_key, watermarks.get(IngestWatermark.CACHE_KEY))
+
+    @staticmethod
+    def _repository_key(gh_repository_id: int):
+        return f'{IngestWatermark.CACHE_KEY}:repo:{gh_repository_id}'
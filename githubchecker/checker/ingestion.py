@@ -0,0 +1,777 @@
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from enum import Enum
+from operator import itemgetter
+from urllib.parse import parse_qs, urlparse
+
+import json
+import time
+import requests
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+from requests.adapters import HTTPAdapter
+
+from .ingest_state import IngestWatermark, RecentCounts
+from .instrumentation import REGISTRY
+from .models import PullRequestStats, Repository, Event, EventRollup, EventType
+
+GITHUB_REQUEST_SECONDS = REGISTRY.histogram(
+    'checker_github_request_seconds', 'Duration of the requests of the GitHub events feed.', ('status', )
+)
+GITHUB_RATE_LIMIT_REMAINING = REGISTRY.gauge(
+    'checker_github_rate_limit_remaining', 'Known remaining GitHub API requests of all tokens.'
+)
+INGEST_PHASE_SECONDS = REGISTRY.histogram(
+    'checker_ingest_phase_seconds', 'Duration of the phases of the ingestion.', ('phase', )
+)
+INGEST_BATCH_EVENTS = REGISTRY.histogram(
+    'checker_ingest_batch_events', 'Recognized events per saved batch.',
+    buckets=(0, 1, 10, 50, 100, 200, 300, 1000, 10000)
+)
+INGEST_EVENTS = REGISTRY.counter(
+    'checker_ingest_events_total', 'Recognized events by result (saved or duplicate).', ('result', )
+)
+DROPPED_EVENTS = REGISTRY.counter(
+    'checker_ingest_dropped_events_total', 'Events of types that are not collected.', ('event_type', )
+)
+
+
+class EventTypes(Enum):
+    """
+    Enumeration representing different types of GitHub events.
+
+    Values:
+    - WatchEvent: Watch event type.
+    - PullRequestEvent: Pull request event type.
+    - IssuesEvent: Issues event type.
+    """
+    WatchEvent = 'WatchEvent'
+    PullRequestEvent = 'PullRequestEvent'
+    IssuesEvent = 'IssuesEvent'
+
+
+class RateLimitExceededError(Exception):
+    """
+    Exception raised when the GitHub API rate limit has been exceeded.
+
+    For fixing the problem check
+    https://docs.github.com/en/rest/overview/resources-in-the-rest-api?apiVersion=2022-11-28#rate-limiting
+    """
+    pass
+
+
+class BoundedCache:
+    """
+    A mapping with a fixed maximum size that evicts the least recently used entries.
+
+    It is used to keep database ids of frequently seen objects in process memory, so that they
+    do not have to be looked up for every parsed event.
+
+    Methods:
+    - get(key, default=None):
+        Returns the value stored for the key (marking it as recently used), or the default.
+    - set(key, value):
+        Stores the value for the key, evicting the least recently used entry if the cache is full.
+    - clear():
+        Removes all entries from the cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GHParser:
+    """
+    The GHParser class provides static methods for parsing GitHub events and saving them to the database.
+
+    Methods:
+    - _process_event(event):
+        Processes an individual GitHub event from the GitHub API response and extracts relevant information.
+        Returns a tuple of (event ID, event type, repository ID, repository name, event datetime), or None if
+        the event type is unrecognized.
+
+    - parse(token: str):
+        Parses GitHub events from the GitHub API, creates Event objects, and saves them to the database.
+
+    - save_events(processed_events):
+        Saves already processed events to the database in one batch.
+
+    Note: This class assumes the existence of appropriate database models (Repository, Event, EventType).
+    Note: This class does not need to be instantiated, as all its methods are static.
+    Note: Database ids of repositories and event types are kept in bounded in-process caches.
+    Note: Ingestion is idempotent: events are keyed on their GitHub event ID, recently saved IDs are
+    remembered in process memory and already stored events are skipped by the database.
+    Note: If `recent_counts` is set (the long-running parser does that), saved events are also added
+    to this `RecentCounts` buffer, which is published to the cache after every batch. Otherwise saving
+    recent events invalidates the published buffer.
+    Note: The `IngestWatermark` is moved after every batch that saved new events, once the recent counts
+    have been published or invalidated.
+    """
+    REPOSITORY_CACHE_SIZE = 10_000
+    SEEN_EVENTS_CACHE_SIZE = 10_000
+    INSERT_BATCH_SIZE = 1000  # Events per INSERT statement, bounded by the number of query parameters
+    STATS_UPDATE_BATCH_SIZE = 100  # Rows per UPDATE; its CASE expressions grow with the number of rows
+
+    _repository_ids = BoundedCache(REPOSITORY_CACHE_SIZE)
+    _event_type_ids = BoundedCache(len(EventTypes))
+    _seen_event_ids = BoundedCache(SEEN_EVENTS_CACHE_SIZE)
+
+    recent_counts = None
+
+    @staticmethod
+    def _process_event(event):
+        """
+        Processes an individual GitHub event from the GitHub API response.
+
+        This method takes as input an event dictionary from the GitHub API, extracts relevant
+        information (event ID, event type, repository ID, repository name, event datetime), and
+        returns it in a tuple. If the event type is not recognized (i.e., it's not in the `EventTypes`
+        enumeration), this method returns None.
+
+        :param event: The GitHub API event dictionary.
+        :return: A tuple of (event ID, event type, repository ID, repository name, event datetime),
+                 or None if the event type is unrecognized.
+        """
+        try:
+            event_type: EventTypes = EventTypes(event['type'])
+        except ValueError:
+            # Event that we do not want to collect information about
+            # For example: `PushEvent`
+            DROPPED_EVENTS.inc(event_type=event['type'])
+            return None
+        event_id = int(event['id'])
+        repo_id = event['repo']['id']
+        repo_name = event['repo']['name']
+        event_datetime = parse_datetime(event['created_at'])
+        return event_id, event_type, repo_id, repo_name, event_datetime
+
+    @staticmethod
+    def parse(token: str):
+        """
+        Parses GitHub events from the GitHub API.
+
+        This method makes a GET request to the GitHub API events endpoint, using the provided
+        authentication token. It parses the returned data, creates Event objects for each
+        recognized event type, and saves these to the database in one batch.
+
+        :param token: The GitHub API token for authentication.
+        :raises RateLimitExceededError: If the API rate limit has been exceeded.
+        :return: The number of saved events.
+        """
+        with GHPoller(token) as poller:
+            return poller.poll()
+
+    @staticmethod
+    def save_events(processed_events):
+        """
+        Saves processed events to the database in one batch.
+
+        Events whose GitHub event ID has been saved recently (or that repeat within the batch) are
+        dropped in memory. Repository and event type ids are resolved from the in-process caches;
+        unseen repositories are upserted with a single statement. The remaining events are then
+        written with a single insert inside one transaction, which skips events that are already
+        stored, so one poll costs a constant number of database round trips. The running pull request
+        statistics of the affected repositories and the per-minute event rollups are updated in the
+        same transaction, from the events the insert reports as inserted. Rows are always inserted and
+        locked in the order of their keys, so concurrent batches (e.g. of parallel backfills) do not deadlock.
+
+        :param processed_events: A list of tuples returned by `_process_event`.
+        :return: The number of newly saved events.
+        """
+        INGEST_BATCH_EVENTS.observe(len(processed_events))
+        saved = GHParser._save_events(processed_events)
+        INGEST_EVENTS.inc(saved, result='saved')
+        INGEST_EVENTS.inc(len(processed_events) - saved, result='duplicate')
+        return saved
+
+    @staticmethod
+    def _save_events(processed_events):
+        """
+        Saves processed events to the database in one batch (see `save_events`), timing every phase.
+
+        :param processed_events: A list of tuples returned by `_process_event`.
+        :return: The number of newly saved events.
+        """
+        unseen_events = {}
+        for processed in processed_events:
+            event_id = processed[0]
+            if event_id not in GHParser._seen_event_ids:
+                unseen_events[event_id] = processed
+        if not unseen_events:
+            return 0
+        processed_events = list(unseen_events.values())
+
+        with INGEST_PHASE_SECONDS.time(phase='resolve'):
+            event_type_ids = GHParser._resolve_event_type_ids({event_type for _, event_type, *_ in processed_events})
+            repository_ids = GHParser._resolve_repository_ids(
+                {repo_id: repo_name for _, _, repo_id, repo_name, _ in processed_events}
+            )
+            GHParser._create_pull_request_stats({
+                repository_ids[repo_id] for _, event_type, repo_id, _, _ in processed_events
+                if event_type == EventTypes.PullRequestEvent
+            })
+
+        events = [
+            Event(
+                gh_event_id=event_id,
+                event_type_id=event_type_ids[event_type],
+                repo_id=repository_ids[repo_id],
+                created_at=event_datetime
+            )
+            for event_id, event_type, repo_id, _, event_datetime in sorted(processed_events, key=itemgetter(0))
+        ]
+        with INGEST_PHASE_SECONDS.time(phase='write'), transaction.atomic():
+            with INGEST_PHASE_SECONDS.time(phase='insert'):
+                inserted_event_ids = GHParser._insert_events(events)
+                events = [event for event in events if event.gh_event_id in inserted_event_ids]
+            with INGEST_PHASE_SECONDS.time(phase='pull_request_stats'):
+                GHParser._update_pull_request_stats(events, event_type_ids.get(EventTypes.PullRequestEvent))
+            with INGEST_PHASE_SECONDS.time(phase='rollups'):
+                GHParser._update_rollups(events)
+
+        for event_id in unseen_events:
+            GHParser._seen_event_ids.set(event_id, True)
+        if not events:
+            return 0
+
+        with INGEST_PHASE_SECONDS.time(phase='publish'):
+            # The watermark is moved last: a response validated by it must not be built from an older snapshot
+            if GHParser.recent_counts is None:
+                RecentCounts.invalidate(max(event.created_at for event in events))
+            elif GHParser.recent_counts.is_invalidated():
+                # The rollups already contain the events of this batch
+                GHParser.recent_counts = RecentCounts.from_database(GHParser.recent_counts.hours)
+                GHParser.recent_counts.publish()
+            else:
+                event_type_names = {pk: event_type.value for event_type, pk in event_type_ids.items()}
+                for event in events:
+                    GHParser.recent_counts.add(event.created_at, event_type_names[event.event_type_id])
+                GHParser.recent_counts.publish()
+            repository_gh_ids = {pk: repo_id for repo_id, pk in repository_ids.items()}
+            IngestWatermark.publish({repository_gh_ids[event.repo_id] for event in events})
+        return len(events)
+
+    @staticmethod
+    def _insert_events(events):
+        """
+        Inserts the events, skipping events that are already stored, and returns the GitHub event IDs of the
+        inserted events.
+
+        Unlike `bulk_create(..., ignore_conflicts=True)`, `INSERT ... ON CONFLICT DO NOTHING RETURNING` reports
+        which rows were inserted, so an event that another process stored concurrently (e.g. a backfill of
+        an overlapping hour) is not counted twice in the rollups and the pull request statistics.
+
+        :param events: A list of unsaved `Event` instances.
+        :return: A set of the GitHub event IDs of the inserted events.
+        """
+        table = Event._meta.db_table
+        columns = ', '.join(
+            Event._meta.get_field(name).column for name in ('gh_event_id', 'event_type', 'repo', 'created_at')
+        )
+        inserted_event_ids = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(events), GHParser.INSERT_BATCH_SIZE):
+                batch = events[start:start + GHParser.INSERT_BATCH_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT DO NOTHING RETURNING gh_event_id',
+                    [
+                        value for event in batch
+                        for value in (
+                            event.gh_event_id,
+                            event.event_type_id,
+                            event.repo_id,
+                            connection.ops.adapt_datetimefield_value(event.created_at),
+                        )
+                    ]
+                )
+                inserted_event_ids.update(event_id for event_id, in cursor.fetchall())
+        return inserted_event_ids
+
+    @staticmethod
+    def _update_rollups(events):
+        """
+        Adds newly saved events to the per-minute rollups of their event types.
+
+        Missing rollups are created with a single statement and the affected rollups are then
+        incremented with one update per distinct increment (a batch rarely has more than a few).
+
+        :param events: A list of newly saved `Event` instances.
+        :return: None
+        """
+        counts = defaultdict(int)
+        for event in events:
+            counts[(event.created_at.replace(second=0, microsecond=0), event.event_type_id)] += 1
+        if not counts:
+            return
+
+        EventRollup.objects.bulk_create(
+            [EventRollup(minute=minute, event_type_id=event_type_id) for minute, event_type_id in sorted(counts)],
+            ignore_conflicts=True
+        )
+        # Concurrent batches (e.g. of parallel backfills) lock the rollups in the same order
+        rollup_ids = {
+            (minute, event_type_id): pk
+            for pk, minute, event_type_id in EventRollup.objects.select_for_update().filter(
+                minute__in={minute for minute, _ in counts},
+                event_type_id__in={event_type_id for _, event_type_id in counts}
+            ).order_by('pk').values_list('pk', 'minute', 'event_type_id')
+        }
+        increments = defaultdict(list)
+        for key, count in counts.items():
+            increments[count].append(rollup_ids[key])
+        for count, pks in increments.items():
+            EventRollup.objects.filter(pk__in=pks).update(count=F('count') + count)
+
+    @staticmethod
+    def _update_pull_request_stats(events, pull_request_type_id):
+        """
+        Accounts newly saved pull request events in the running statistics of their repositories.
+
+        The statistics rows (created by `_create_pull_request_stats`) are locked in the order of their
+        repositories for the rest of the transaction. The events may arrive in any order (e.g. from GH Archive
+        backfills), as the statistics only keep their number and the first and the last creation time.
+
+        :param events: A list of newly saved `Event` instances.
+        :param pull_request_type_id: The primary key of the `PullRequestEvent` event type.
+        :return: None
+        """
+        pull_requests = defaultdict(list)
+        for event in events:
+            if event.event_type_id == pull_request_type_id:
+                pull_requests[event.repo_id].append(event)
+        if not pull_requests:
+            return
+
+        stats = list(PullRequestStats.objects.select_for_update().filter(repo_id__in=pull_requests).order_by('repo_id'))
+        for repo_stats in stats:
+            for event in pull_requests[repo_stats.repo_id]:
+                repo_stats.add_event(event.created_at)
+        PullRequestStats.objects.bulk_update(
+            stats,
+            ['count', 'first_at', 'last_at'],
+            batch_size=GHParser.STATS_UPDATE_BATCH_SIZE
+        )
+
+    @staticmethod
+    def _create_pull_request_stats(repository_ids):
+        """
+        Creates the missing pull request statistics rows of the given repositories.
+
+        The rows are inserted in the order of their repositories and outside of the transaction in which
+        the events are saved, so concurrent batches (e.g. of `import_gharchive --processes N`) that add
+        the same new repositories do not deadlock.
+
+        :param repository_ids: A set of `Repository` primary keys.
+        :return: None
+        """
+        if repository_ids:
+            PullRequestStats.objects.bulk_create(
+                [PullRequestStats(repo_id=repo_id) for repo_id in sorted(repository_ids)],
+                ignore_conflicts=True
+            )
+
+    @staticmethod
+    def _resolve_event_type_ids(event_types):
+        """
+        Resolves database ids of the given event types, creating missing event types.
+
+        :param event_types: A set of `EventTypes` members.
+        :return: A dictionary mapping `EventTypes` members to `EventType` primary keys.
+        """
+        resolved = {event_type: GHParser._event_type_ids.get(event_type) for event_type in event_types}
+        missing = [event_type.name for event_type, pk in resolved.items() if pk is None]
+        if missing:
+            EventType.objects.bulk_create(
+                [EventType(event_type=name) for name in missing],
+                ignore_conflicts=True
+            )
+            for pk, name in EventType.objects.filter(event_type__in=missing).values_list('pk', 'event_type'):
+                event_type = EventTypes(name)
+                GHParser._event_type_ids.set(event_type, pk)
+                resolved[event_type] = pk
+        return resolved
+
+    @staticmethod
+    def _resolve_repository_ids(repositories):
+        """
+        Resolves database ids of the given GitHub repositories, upserting unseen repositories.
+
+        Repositories that are not in the cache are inserted with a single statement that ignores
+        already existing rows, and their ids are then read back with a single query. The rows are
+        inserted in the order of their GitHub IDs, so concurrent batches cannot deadlock on them.
+
+        :param repositories: A dictionary mapping GitHub repository IDs to repository names.
+        :return: A dictionary mapping GitHub repository IDs to `Repository` primary keys.
+        """
+        resolved = {repo_id: GHParser._repository_ids.get(repo_id) for repo_id in repositories}
+        missing = sorted(repo_id for repo_id, pk in resolved.items() if pk is None)
+        if missing:
+            Repository.objects.bulk_create(
+                [Repository(gh_repo_id=repo_id, name=repositories[repo_id]) for repo_id in missing],
+                ignore_conflicts=True
+            )
+            for pk, repo_id in Repository.objects.filter(gh_repo_id__in=missing).values_list('pk', 'gh_repo_id'):
+                GHParser._repository_ids.set(repo_id, pk)
+                resolved[repo_id] = pk
+        return resolved
+
+
+class TokenPool:
+    """
+    The TokenPool class keeps the rate limit state of several GitHub API tokens.
+
+    The remaining quota and the reset time of every token are tracked from the
+    `X-RateLimit-Remaining` and `X-RateLimit-Reset` response headers. Each request is sent with
+    the token that has the most headroom; an exhausted token is skipped until its limit resets.
+    The pool is thread-safe, so it can be shared by concurrently fetched pages.
+
+    Methods:
+    - acquire():
+        Returns the token with the most remaining requests, or None if all tokens are exhausted.
+    - update(token, headers):
+        Updates the rate limit state of the token from response headers.
+    - mark_exhausted(token):
+        Marks the token as exhausted until its limit resets.
+    - next_delay(reserve):
+        Returns the minimal number of seconds between two requests that keeps every token above
+        the reserve until its limit resets.
+    - remaining():
+        Returns the total number of known remaining requests of all tokens.
+    """
+    DEFAULT_RESET_DELAY = 60  # Seconds an exhausted token is skipped if its reset time is unknown
+
+    def __init__(self, tokens):
+        """
+        :param tokens: A list of GitHub API tokens.
+        """
+        if not tokens:
+            raise ValueError('At least one GitHub token is required')
+        # token -> [remaining requests or None if unknown, reset timestamp or None if unknown]
+        self._limits = {token: [None, None] for token in tokens}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._limits)
+
+    def acquire(self):
+        """
+        Returns the token with the most remaining requests and reserves one request of it.
+
+        Tokens whose limit has not been reported yet are preferred, tokens whose reset time has
+        passed are considered to have a full quota again.
+
+        :return: The token, or None if all tokens are exhausted.
+        """
+        with self._lock:
+            now = time.time()
+            best_token, best_remaining = None, 0
+            for token, limit in self._limits.items():
+                remaining, reset = limit
+                if remaining is None or (reset is not None and reset <= now):
+                    limit[0] = None
+                    return token
+                if remaining > best_remaining:
+                    best_token, best_remaining = token, remaining
+            if best_token is not None:
+                self._limits[best_token][0] -= 1
+            return best_token
+
+    def update(self, token: str, headers):
+        """
+        Updates the rate limit state of the token from response headers.
+
+        :param token: The token the request was sent with.
+        :param headers: The headers of the GitHub API response.
+        :return: None
+        """
+        if 'X-RateLimit-Remaining' not in headers or 'X-RateLimit-Reset' not in headers:
+            return
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset = int(headers['X-RateLimit-Reset'])
+        with self._lock:
+            limit = self._limits[token]
+            # Concurrent responses of one rate limit window may arrive out of order
+            if reset == limit[1] and limit[0] is not None:
+                remaining = min(remaining, limit[0])
+            limit[0], limit[1] = remaining, reset
+
+    def mark_exhausted(self, token: str):
+        """
+        Marks the token as exhausted until its limit resets.
+
+        :param token: The exhausted token.
+        :return: None
+        """
+        with self._lock:
+            limit = self._limits[token]
+            limit[0] = 0
+            if limit[1] is None or limit[1] <= time.time():
+                limit[1] = int(time.time()) + self.DEFAULT_RESET_DELAY
+
+    def next_delay(self, reserve: int = 0):
+        """
+        Returns the minimal number of seconds between two requests.
+
+        Every token may spend its remaining requests (minus the reserve) evenly until its limit
+        resets; the rates of all tokens add up. If no token has requests left, the delay lasts
+        until the earliest reset.
+
+        :param reserve: The number of requests every token keeps until its limit resets.
+        :return: The delay in seconds.
+        """
+        with self._lock:
+            now = time.time()
+            rate = 0
+            earliest_reset = None
+            for remaining, reset in self._limits.values():
+                if remaining is None or reset is None or reset <= now:
+                    return 0
+                available = remaining - reserve
+                if available > 0:
+                    rate += available / max(reset - now, 1)
+                elif earliest_reset is None or reset < earliest_reset:
+                    earliest_reset = reset
+            if rate:
+                return 1 / rate
+            return max(earliest_reset - now, 0)
+
+    def remaining(self):
+        """
+        Returns the total number of known remaining requests of all tokens.
+
+        :return: The number of remaining requests.
+        """
+        with self._lock:
+            return sum(remaining for remaining, _ in self._limits.values() if remaining is not None)
+
+
+class GHPoller:
+    """
+    The GHPoller class polls the GitHub events feed adaptively and saves new events to the database.
+
+    Unlike `GHParser.parse`, a poller keeps state between polls: it sends conditional requests
+    with the last received `ETag`, treats `304 Not Modified` responses as no-ops, follows the
+    `X-Poll-Interval` header and slows down before `X-RateLimit-Remaining` reaches zero.
+
+    A poller can be given several tokens. Every request is sent with the token that has the most
+    headroom (see `TokenPool`); if a token is exhausted, the request is retried with the other
+    tokens, and `RateLimitExceededError` is raised only when all of them are exhausted.
+
+    All pages of the feed are fetched over one keep-alive session: the first page is requested
+    first (it carries the `ETag` and the `Link` header with the number of pages), the remaining
+    pages are then requested concurrently from a thread pool.
+
+    Methods:
+    - fetch():
+        Fetches all pages of the events feed and returns the merged, deduplicated list of events,
+        or an empty list if the feed has not changed.
+
+    - poll():
+        Fetches the events feed once and saves recognized events to the database.
+        Returns the number of saved events.
+
+    - next_delay():
+        Returns the number of seconds to wait before the next poll.
+
+    - close():
+        Releases the HTTP session and the thread pool.
+
+    Usage:
+        with GHPoller([token_1, token_2]) as poller:
+            while True:
+                poller.poll()
+                time.sleep(poller.next_delay())
+    """
+    EVENTS_URL = 'https://api.github.com/events'
+    PER_PAGE = 100  # Maximal page size of the events feed
+    MAX_PAGES = 3  # GitHub serves at most 300 events of the feed
+    DEFAULT_POLL_INTERVAL = 60  # Seconds, used until GitHub sends `X-Poll-Interval`
+    RATE_LIMIT_RESERVE = 50  # Requests that are kept in reserve until the rate limit resets
+    TIMEOUT = 10  # Seconds
+
+    def __init__(self, tokens, events_url: str = EVENTS_URL, min_interval: float = 0,
+                 max_pages: int = MAX_PAGES):
+        """
+        :param tokens: The GitHub API token for authentication, or a list of tokens.
+        :param events_url: The URL of the events feed.
+        :param min_interval: The minimal number of seconds between two polls.
+        :param max_pages: The maximal number of feed pages fetched per poll.
+        """
+        self.tokens = TokenPool([tokens] if isinstance(tokens, str) else list(tokens))
+        self.events_url = events_url
+        self.min_interval = min_interval
+        self.max_pages = max_pages
+        self.etag = None
+        self.poll_interval = self.DEFAULT_POLL_INTERVAL
+
+        self._session = requests.Session()
+        self._session.mount(events_url, HTTPAdapter(pool_maxsize=max_pages))
+        self._executor = ThreadPoolExecutor(max_workers=max(max_pages - 1, 1), thread_name_prefix='gh-poller')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the HTTP session and the thread pool.
+
+        :return: None
+        """
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def fetch(self):
+        """
+        Fetches all pages of the events feed.
+
+        The first page is requested conditionally on the `ETag` of the previous poll. If the feed
+        has not changed, GitHub answers with `304 Not Modified`, which does not count against the
+        rate limit, and no further pages are requested. Otherwise the remaining pages listed in the
+        `Link` header are requested concurrently and merged with the first one; events that moved
+        between pages while they were fetched are deduplicated by their ID. The new `ETag` is only
+        kept once all pages have been fetched and decoded, so a poll that fails on a later page is
+        repeated in full instead of being answered with `304 Not Modified`.
+
+        :raises RateLimitExceededError: If the API rate limit has been exceeded.
+        :return: A list of GitHub API event dictionaries, newest first.
+        """
+        headers = {'If-None-Match': self.etag} if self.etag is not None else {}
+        response = self._get(1, headers)
+        if response.status_code == 304:
+            return []
+
+        pages = [json.loads(response.text)]
+        last_page = self._get_last_page(response)
+        pages.extend(
+            json.loads(page_response.text)
+            for page_response in self._executor.map(self._get, range(2, last_page + 1))
+            if page_response.status_code != 304
+        )
+        self.etag = response.headers.get('ETag')
+
+        events = {}
+        for page in pages:
+            for event in page:
+                events.setdefault(event['id'], event)
+        return list(events.values())
+
+    def poll(self):
+        """
+        Fetches the events feed once and saves recognized events to the database.
+
+        If the feed has not changed since the previous poll, neither JSON decoding nor database
+        work is done.
+
+        :raises RateLimitExceededError: If the API rate limit has been exceeded.
+        :return: The number of saved events.
+        """
+        with INGEST_PHASE_SECONDS.time(phase='fetch'):
+            events = self.fetch()
+        with INGEST_PHASE_SECONDS.time(phase='process'):
+            processed_events = [
+                processed for processed in map(GHParser._process_event, events) if processed is not None
+            ]
+        return GHParser.save_events(processed_events)
+
+    def _get(self, page: int, headers=None):
+        """
+        Requests one page of the events feed and updates the rate limit state.
+
+        The request is sent with the token that has the most headroom. If GitHub reports that the
+        token is exhausted, the request is retried with the next best token.
+
+        :param page: The number of the page, starting at 1.
+        :param headers: Additional request headers.
+        :raises RateLimitExceededError: If the API rate limit of all tokens has been exceeded.
+        :return: The response of a successful (or not modified) request.
+        """
+        while (token := self.tokens.acquire()) is not None:
+            started = time.perf_counter()
+            response = self._session.get(
+                self.events_url,
+                params={'per_page': self.PER_PAGE, 'page': page},
+                headers={**(headers or {}), 'Authorization': token},
+                timeout=self.TIMEOUT
+            )
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, status=response.status_code)
+            self._update_limits(token, response.headers)
+            if response.status_code == 429 or \
+                    (response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0'):
+                self.tokens.mark_exhausted(token)
+                continue
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+        raise RateLimitExceededError("We've crossed the limit of possible messages for all tokens.\nUser access "
+                                     "token requests are limited to 5,000 requests per hour.")
+
+    def _get_last_page(self, response):
+        """
+        Returns the number of the last page to fetch, based on the `Link` header of the first page.
+
+        :param response: The response for the first page of the feed.
+        :return: The number of the last page, at most `max_pages`.
+        """
+        last_link = response.links.get('last')
+        if last_link is None:
+            return 1
+        try:
+            last_page = int(parse_qs(urlparse(last_link['url']).query)['page'][0])
+        except (KeyError, ValueError):
+            return 1
+        return min(last_page, self.max_pages)
+
+    def next_delay(self):
+        """
+        Returns the number of seconds to wait before the next poll.
+
+        The delay is at least the poll interval requested by GitHub (and `min_interval`). When the
+        rate limits are known, the remaining requests of every token (minus a reserve) are spread
+        evenly until its limit resets, so the poller slows down before it runs out of requests.
+
+        :return: The delay in seconds.
+        """
+        return max(self.min_interval, self.poll_interval, self.tokens.next_delay(self.RATE_LIMIT_RESERVE))
+
+    def _update_limits(self, token: str, headers):
+        """
+        Updates the poll interval and the rate limit state of the token from response headers.
+
+        :param token: The token the request was sent with.
+        :param headers: The headers of the GitHub API response.
+        :return: None
+        """
+        if 'X-Poll-Interval' in headers:
+            self.poll_interval = int(headers['X-Poll-Interval'])
+        self.tokens.update(token, headers)
+        GITHUB_RATE_LIMIT_REMAINING.set(self.tokens.remaining())
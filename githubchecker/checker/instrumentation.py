@@ -0,0 +1,333 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Metric:
+    """
+    Base class of the metrics of the registry.
+
+    A metric has a value per combination of label values. Values are updated under a lock,
+    so a metric can be shared by threads.
+
+    Methods:
+    - samples():
+        Returns a list of (suffix, labels, value) tuples of the current values.
+    """
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        """
+        :param name: The name of the metric.
+        :param documentation: The help text of the metric.
+        :param labelnames: The names of the labels of the metric.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects the labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        with self._lock:
+            return [('', self._labels(key), value) for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    """
+    A metric whose values only increase, such as a number of processed events.
+    """
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A metric whose values can go up and down, such as the remaining API requests.
+    """
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    A metric that counts observations in buckets, such as request durations.
+
+    Methods:
+    - observe(value, **labels):
+        Records an observation.
+    - time(**labels):
+        Returns a context manager that observes the number of seconds its block takes.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        :param name: The name of the metric.
+        :param documentation: The help text of the metric.
+        :param labelnames: The names of the labels of the metric.
+        :param buckets: The upper bounds of the buckets, in ascending order.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., count of the +Inf bucket, sum]
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf', ), state):
+                    cumulative += count
+                    samples.append(('_bucket', {**labels, 'le': str(bound)}, cumulative))
+                samples.append(('_sum', labels, state[-1]))
+                samples.append(('_count', labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    The Registry class keeps the metrics of the process and renders them in the Prometheus text format.
+
+    Every process (web worker, parser) has its own registry, which contains the metrics of the
+    modules it has imported; Prometheus scrapes every process separately.
+
+    Methods:
+    - counter(name, documentation, labelnames), gauge(...), histogram(..., buckets):
+        Creates and registers a metric, or returns the already registered metric of that name.
+    - render():
+        Returns the current values of all metrics in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'checker_http_request_seconds', 'Time until the response of a view is returned.', ('view', 'method', 'status')
+)
+HTTP_DB_QUERIES = REGISTRY.histogram(
+    'checker_http_db_queries', 'Database queries per request.', ('view', ), buckets=COUNT_BUCKETS
+)
+HTTP_DB_SECONDS = REGISTRY.histogram(
+    'checker_http_db_seconds', 'Time spent in database queries per request.', ('view', )
+)
+
+# [number of queries, seconds] of the request being handled, shared with the threads it runs queries in
+_request_queries = ContextVar('checker_request_queries', default=None)
+
+
+def timed(histogram: Histogram, **labels):
+    """
+    Decorator that observes the duration of every call of the function in the histogram.
+
+    Coroutine functions are timed until their coroutine completes.
+
+    :param histogram: The histogram of the durations.
+    :param labels: The label values of the observations.
+    :return: The decorator.
+    """
+    def decorator(function):
+        if iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that counts the queries of the request being handled and their duration.
+    """
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - started
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_recorder)
+
+
+class InstrumentationMiddleware:
+    """
+    Middleware that records the latency, the number of database queries and the database time of every view.
+
+    The observations are labelled with the resolved view (or 'unresolved'). Database queries are counted
+    by an execute wrapper that is installed on every database connection and attributes the queries to
+    the request through a context variable, so queries run by async views in worker threads are counted
+    as well. The latency of streaming responses covers the time until streaming starts.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _install_query_recorder(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def _observe(request, response, seconds: float, queries):
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match is not None else 'unresolved'
+        HTTP_REQUEST_SECONDS.observe(seconds, view=view, method=request.method, status=response.status_code)
+        HTTP_DB_QUERIES.observe(queries[0], view=view)
+        HTTP_DB_SECONDS.observe(queries[1], view=view)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, address: str = '127.0.0.1'):
+    """
+    Serves the metrics of the process in a daemon thread, for processes without a web server (the parser).
+
+    :param port: The port to listen on.
+    :param address: The address to listen on (defaults to the loopback address, like `INTERNAL_IPS`).
+    :return: The HTTP server.
+    """
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,18 @@
+from argparse import ArgumentTypeError
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def datetime_argument(value: str):
+    """
+    Parses an ISO 8601 datetime command line argument, treating naive datetimes as being in the current time zone.
+
+    :param value: The command line argument.
+    :raises ArgumentTypeError: If the argument is not a datetime.
+    :return: An aware datetime.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ArgumentTypeError(f'invalid datetime: {value!r}')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
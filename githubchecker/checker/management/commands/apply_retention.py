@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from checker.retention import EventRetention
+
+
+class Command(BaseCommand):
+    """
+    Management command that downsamples raw events older than the retention period.
+
+    Events created before the start of the hour `--retention-days` days ago are folded into hourly
+    per-repository aggregates and deleted in batches of `--batch-size` events. Every batch is folded
+    and deleted in its own short transaction, followed by a pause of `--sleep` seconds, so the job
+    neither holds locks for long nor competes with the parser for the database. The batches are
+    paginated by creation time, so the job does not rescan the index entries of deleted events.
+
+    Per-repository time series of the deleted time ranges are answered from the aggregates, and
+    time series of all repositories from the per-minute rollups, which are kept.
+
+    Note: On a partitioned event table, `python manage.py event_partitions drop-expired` folds and
+    drops whole daily partitions instead; this command then only has to clean up the default partition.
+    Note: The running pull request statistics are kept, but the full interval distribution
+    (`?stats=full`) only covers the remaining raw events.
+
+    Usage:
+        python manage.py apply_retention [--retention-days N] [--batch-size N] [--sleep SECONDS]
+    """
+    help = 'Folds events older than the retention period into hourly aggregates and deletes them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.EVENT_RETENTION_DAYS,
+            help='Age in days after which raw events are downsampled (default: settings.EVENT_RETENTION_DAYS).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EventRetention.BATCH_SIZE,
+            help=f'Events folded and deleted per transaction (default: {EventRetention.BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to pause between two batches (default: 0.1).'
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('The retention period and the batch size have to be positive.')
+
+        cutoff = (timezone.now() - timedelta(days=options['retention_days'])).replace(
+            minute=0, second=0, microsecond=0
+        )
+        deleted, position = 0, None
+        while True:
+            batch_deleted, position = EventRetention.fold_batch(cutoff, position, options['batch_size'])
+            if not batch_deleted:
+                break
+            deleted += batch_deleted
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Downsampled {deleted} event(-s), up to {position}.')
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Downsampled {deleted} event(-s) created before {cutoff}.'))
@@ -0,0 +1,221 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from checker.models import Event
+from checker.retention import EventRetention
+
+PARTITION_PREFIX = f'{Event._meta.db_table}_p'
+PARTITION_DATE_FORMAT = '%Y%m%d'
+
+
+class Command(BaseCommand):
+    """
+    Management command that stores events in daily PostgreSQL partitions.
+
+    Actions:
+    - setup:
+        Converts the event table into a table partitioned by `created_at`. The existing rows are kept
+        in place and become the default partition, so the conversion does not copy older events.
+        The daily partitions are created as with `create`.
+    - create:
+        Creates the daily partitions of the next `--days-ahead` days, moving the events of these days
+        that are stored in the default partition into them.
+    - drop-expired:
+        Detaches and drops the daily partitions that are older than `--retention-days` days.
+        Dropping a partition is a metadata operation, it neither deletes rows one by one nor
+        locks the partitions that receive new events. The events of a partition are folded into
+        the hourly aggregates in the same transaction, so they remain in per-repository time series.
+
+    Note: On a partitioned table the primary key is (id, created_at) and the GitHub event ID is
+    unique per (gh_event_id, created_at). Ingestion stays idempotent because `created_at` is
+    the creation time of the event on GitHub.
+    Note: Schema migrations of the `Event` model have to be applied manually after `setup`.
+
+    Usage:
+        python manage.py event_partitions setup
+        python manage.py event_partitions create [--days-ahead N]
+        python manage.py event_partitions drop-expired [--retention-days N]
+    """
+    help = 'Manages daily PostgreSQL partitions of the event table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['setup', 'create', 'drop-expired'])
+        parser.add_argument(
+            '--days-ahead',
+            type=int,
+            default=7,
+            help='Number of future daily partitions to create (default: 7).'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.EVENT_RETENTION_DAYS,
+            help='Age in days after which partitions are dropped (default: settings.EVENT_RETENTION_DAYS).'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Event partitions are only supported on PostgreSQL.')
+
+        action = options['action']
+        if action == 'setup':
+            self._setup()
+            self._create(options['days_ahead'])
+        elif action == 'create':
+            self._require_partitioned()
+            self._create(options['days_ahead'])
+        else:
+            self._require_partitioned()
+            self._drop_expired(options['retention_days'])
+
+    def _is_partitioned(self):
+        """
+        Checks whether the event table is a partitioned table.
+
+        :return: True if the event table is partitioned.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+                [Event._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row is not None and row[0] == 'p'
+
+    def _require_partitioned(self):
+        if not self._is_partitioned():
+            raise CommandError('The event table is not partitioned. Run `event_partitions setup` first.')
+
+    def _setup(self):
+        """
+        Converts the event table into a table partitioned by range of `created_at`.
+
+        The existing table is renamed and attached as the default partition of a new partitioned
+        table with the same columns, so no rows are copied.
+
+        :return: None
+        """
+        if self._is_partitioned():
+            self.stdout.write('The event table is already partitioned.')
+            return
+
+        table = Event._meta.db_table
+        default_partition = f'{table}_default'
+        event_type_table = Event._meta.get_field('event_type').related_model._meta.db_table
+        repository_table = Event._meta.get_field('repo').related_model._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+            next_id = cursor.fetchone()[0]
+
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                [table]
+            )
+            primary_key = cursor.fetchone()[0]
+
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {default_partition}')
+            cursor.execute(f'ALTER TABLE {default_partition} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+            # The primary key of a partition has to match the primary key of the partitioned table
+            cursor.execute(f'ALTER TABLE {default_partition} DROP CONSTRAINT {primary_key}')
+            cursor.execute(f'ALTER TABLE {default_partition} ADD PRIMARY KEY (id, created_at)')
+            cursor.execute(
+                f'CREATE TABLE {table} (LIKE {default_partition} INCLUDING DEFAULTS) '
+                f'PARTITION BY RANGE (created_at)'
+            )
+            cursor.execute(
+                f'ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {next_id})'
+            )
+            cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)')
+            cursor.execute(f'ALTER TABLE {table} ADD UNIQUE (gh_event_id, created_at)')
+            cursor.execute(f'ALTER TABLE {table} ADD FOREIGN KEY (event_type_id) REFERENCES {event_type_table} (id)')
+            cursor.execute(f'ALTER TABLE {table} ADD FOREIGN KEY (repo_id) REFERENCES {repository_table} (id)')
+            cursor.execute(f'CREATE INDEX {table}_p_created_type_idx ON {table} (created_at, event_type_id)')
+            cursor.execute(
+                f'CREATE INDEX {table}_p_repo_type_created_idx ON {table} (repo_id, event_type_id, created_at)'
+            )
+            cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default_partition} DEFAULT')
+        self.stdout.write(self.style.SUCCESS(f'Converted {table} into a partitioned table.'))
+
+    def _create(self, days_ahead: int):
+        """
+        Creates the daily partitions from today until `days_ahead` days in the future.
+
+        Events of a day that were stored before its partition existed (e.g. today's events right after
+        `setup`) are in the default partition, which PostgreSQL does not allow to overlap a new partition.
+        Each partition is therefore created as a plain table, the events of its day are moved into it from
+        the default partition and it is attached, all in one transaction.
+
+        :param days_ahead: The number of future days to create partitions for.
+        :return: None
+        """
+        table = Event._meta.db_table
+        default_partition = f'{table}_default'
+        today = timezone.now().date()
+        created = moved = 0
+        for day in (today + timedelta(days=offset) for offset in range(days_ahead + 1)):
+            partition = f'{PARTITION_PREFIX}{day.strftime(PARTITION_DATE_FORMAT)}'
+            bounds = [f'{day.isoformat()} 00:00:00+00', f'{(day + timedelta(days=1)).isoformat()} 00:00:00+00']
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT to_regclass(%s)', [partition])
+                if cursor.fetchone()[0] is not None:
+                    continue
+                # Events of the day must not reach the default partition before the new partition is attached
+                cursor.execute(f'LOCK TABLE {default_partition} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH moved AS ('
+                    f'DELETE FROM {default_partition} WHERE created_at >= %s AND created_at < %s RETURNING *'
+                    f') INSERT INTO {partition} SELECT * FROM moved',
+                    bounds
+                )
+                moved += cursor.rowcount
+                cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)', bounds)
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Daily partitions until {today + timedelta(days=days_ahead)} exist '
+            f'({created} created, {moved} event(-s) moved from the default partition).'
+        ))
+
+    def _drop_expired(self, retention_days: int):
+        """
+        Detaches and drops the daily partitions that are older than `retention_days` days,
+        after folding their events into the hourly aggregates.
+
+        :param retention_days: The age in days after which partitions are dropped.
+        :return: None
+        """
+        table = Event._meta.db_table
+        cutoff = timezone.now().date() - timedelta(days=retention_days)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname FROM pg_inherits '
+                'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = to_regclass(%s) AND child.relname LIKE %s',
+                [table, f'{PARTITION_PREFIX}%']
+            )
+            partitions = sorted(row[0] for row in cursor.fetchall())
+
+        dropped = folded = 0
+        for partition in partitions:
+            try:
+                day = date(*map(int, (partition[-8:-4], partition[-4:-2], partition[-2:])))
+            except ValueError:
+                continue
+            if day >= cutoff:
+                continue
+            day_start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+            with transaction.atomic(), connection.cursor() as cursor:
+                folded += EventRetention.fold(
+                    Event.objects.filter(created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1))
+                )
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {partition}')
+                cursor.execute(f'DROP TABLE {partition}')
+            dropped += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Dropped {dropped} partition(-s) older than {cutoff}, folding {folded} event(-s) into hourly aggregates.'
+        ))
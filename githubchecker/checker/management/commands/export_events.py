@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from checker.export import EventExport
+from checker.management.arguments import datetime_argument
+
+
+class Command(BaseCommand):
+    """
+    Management command that exports the events created within a time range as CSV or NDJSON.
+
+    The events are read from a server-side cursor in chunks and written chunk by chunk, so the
+    memory used by the command does not depend on the number of exported events
+    (see `checker.export.EventExport`).
+
+    Usage:
+        python manage.py export_events --start DATETIME [--end DATETIME] [--repo ID]
+                                       [--format csv|ndjson] [--output FILE] [--chunk-size N]
+    """
+    help = 'Exports the events created within a time range as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=datetime_argument,
+            required=True,
+            help='Export the events created at or after this ISO 8601 datetime.'
+        )
+        parser.add_argument(
+            '--end',
+            type=datetime_argument,
+            help='Export the events created before this ISO 8601 datetime (default: now).'
+        )
+        parser.add_argument('--repo', type=int, help='Only export the events of this GitHub repository ID.')
+        parser.add_argument('--format', choices=EventExport.CONTENT_TYPES, default='csv', help='Default: csv.')
+        parser.add_argument('--output', help='The file to write the events to (default: standard output).')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EventExport.CHUNK_SIZE,
+            help=f'Events read from the cursor at once (default: {EventExport.CHUNK_SIZE}).'
+        )
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.now()
+        if options['start'] >= end:
+            raise CommandError('The start has to be before the end.')
+
+        chunks = EventExport.chunks(
+            options['start'], end, options['format'], options['repo'], options['chunk_size']
+        )
+        if options['output'] is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Events exported to {options["output"]}.'))
@@ -0,0 +1,122 @@
+import gzip
+import json
+import multiprocessing
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from checker.ingestion import EventTypes, GHParser
+
+# Quoted names of the collected event types. A line that contains none of them
+# cannot be a collected event, so it is skipped without being decoded
+EVENT_TYPE_MARKERS = tuple(f'"{event_type.value}"' for event_type in EventTypes)
+
+
+def import_file(path: str, batch_size: int):
+    """
+    Imports one gzipped GH Archive NDJSON file into the database.
+
+    The file is streamed one line at a time, so memory usage does not depend on its size.
+    Recognized events are collected into batches of `batch_size` events, and every batch
+    is saved with `GHParser.save_events` in one transaction.
+
+    :param path: The path of the `.json.gz` file.
+    :param batch_size: The number of events saved per transaction.
+    :return: A tuple of (path, number of read lines, number of saved events, skipped lines, seconds).
+    """
+    started = time.perf_counter()
+    lines = saved = skipped = 0
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            lines += 1
+            if not any(marker in line for marker in EVENT_TYPE_MARKERS):
+                continue
+            try:
+                processed = GHParser._process_event(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                # Malformed line or an event in an old archive format
+                skipped += 1
+                continue
+            if processed is None:
+                continue
+            batch.append(processed)
+            if len(batch) >= batch_size:
+                saved += GHParser.save_events(batch)
+                batch = []
+    saved += GHParser.save_events(batch)
+    return path, lines, saved, skipped, time.perf_counter() - started
+
+
+def _import_file(args):
+    """
+    Unpacks the arguments of `import_file` for `Pool.imap_unordered`.
+    """
+    return import_file(*args)
+
+
+def _init_worker():
+    """
+    Prepares a worker process: sets Django up (when the process is spawned) and makes sure
+    that no database connection is shared with the parent process.
+    """
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    """
+    Management command that backfills events from GH Archive (https://www.gharchive.org/) dumps.
+
+    Every hour file is a gzipped NDJSON file with one GitHub event per line. Files are streamed
+    line by line with constant memory, filtered with `GHParser._process_event` and written in
+    large batches. Several files are imported in parallel by a pool of processes. The command
+    runs entirely offline from local files; events that are already stored are skipped.
+
+    Usage:
+        python manage.py import_gharchive 2024-01-01-{0..23}.json.gz [--processes N] [--batch-size N]
+    """
+    help = 'Imports events from local gzipped GH Archive NDJSON hour files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='GH Archive hour files (*.json.gz).')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of files imported in parallel (default: number of CPUs).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10_000,
+            help='Number of events saved per transaction (default: 10000).'
+        )
+
+    def handle(self, *args, **options):
+        files, processes, batch_size = options['files'], options['processes'], options['batch_size']
+        if processes < 1 or batch_size < 1:
+            raise CommandError('--processes and --batch-size must be positive.')
+
+        # Worker processes have to open their own database connections
+        connections.close_all()
+
+        started = time.perf_counter()
+        total_lines = total_saved = 0
+        with multiprocessing.Pool(min(processes, len(files)), initializer=_init_worker) as pool:
+            tasks = [(path, batch_size) for path in files]
+            for path, lines, saved, skipped, seconds in pool.imap_unordered(_import_file, tasks):
+                total_lines += lines
+                total_saved += saved
+                self.stdout.write(
+                    f'{path}: {lines} lines, {saved} events saved, {skipped} skipped '
+                    f'in {seconds:.1f}s ({lines / seconds:.0f} lines/s)'
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(files)} file(-s): {total_lines} lines, {total_saved} events saved '
+            f'in {elapsed:.1f}s ({total_lines / elapsed:.0f} lines/s, {total_saved / elapsed:.0f} events/s)'
+        ))
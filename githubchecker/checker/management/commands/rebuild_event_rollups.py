@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncMinute
+
+from checker.management.arguments import datetime_argument
+from checker.models import Event, EventRollup
+
+
+class Command(BaseCommand):
+    """
+    Management command that recomputes the per-minute event rollups from the stored events.
+
+    The rollups are normally maintained by the parser; this command is needed once for events that
+    were stored before the rollups existed, or after events were removed. The counts are computed by
+    the database and written in batches, within one transaction. Rollups older than the oldest stored
+    event (e.g. of events downsampled by `apply_retention`) are kept.
+
+    Usage:
+        python manage.py rebuild_event_rollups [--since DATETIME]
+    """
+    help = 'Recomputes the per-minute event rollups from stored events.'
+    BATCH_SIZE = 10_000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=datetime_argument,
+            help='Only rebuild the rollups of events created at or after this ISO 8601 datetime '
+                 '(default: the oldest stored event).'
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        rollups = EventRollup.objects.all()
+        since = options['since'] or events.aggregate(oldest=Min('created_at'))['oldest']
+        if since is None:
+            self.stdout.write('There are no stored events to rebuild the rollups from.')
+            return
+        since = since.replace(second=0, microsecond=0)
+        events = events.filter(created_at__gte=since)
+        rollups = rollups.filter(minute__gte=since)
+
+        counts = events.annotate(minute=TruncMinute('created_at')) \
+            .values('minute', 'event_type_id') \
+            .annotate(count=Count('id')) \
+            .order_by()
+
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in counts.iterator(chunk_size=self.BATCH_SIZE):
+                batch.append(EventRollup(**row))
+                if len(batch) >= self.BATCH_SIZE:
+                    created += len(EventRollup.objects.bulk_create(batch))
+                    batch = []
+            created += len(EventRollup.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} event rollups.'))
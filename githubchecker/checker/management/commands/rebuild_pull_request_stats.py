@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from checker.models import Event, EventHourlyAggregate, PullRequestStats
+from checker.ingestion import EventTypes
+
+
+class Command(BaseCommand):
+    """
+    Management command that recomputes the running pull request statistics from the stored events.
+
+    The statistics are normally maintained by the parser; this command is needed once for events that
+    were stored before the statistics existed. The statistics of all repositories are computed by the
+    database with one grouped query and written with one upsert, in one transaction that locks the
+    existing statistics rows, so batches saved by the parser meanwhile are not lost.
+
+    Note: The command is only valid before retention (`apply_retention` or `event_partitions drop-expired`)
+    has removed pull request events, as their statistics cannot be recomputed from the hourly aggregates.
+    It refuses to run in that case, unless `--allow-truncated` is passed; the statistics then only cover
+    the remaining events and are reset for repositories without remaining pull request events.
+
+    Usage:
+        python manage.py rebuild_pull_request_stats [--repo GITHUB_REPOSITORY_ID ...] [--allow-truncated]
+    """
+    help = 'Recomputes the pull request statistics of all (or the given) repositories from stored events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repo',
+            type=int,
+            action='append',
+            dest='repos',
+            help='GitHub ID of a repository to rebuild, may be repeated (default: all repositories).'
+        )
+        parser.add_argument(
+            '--allow-truncated',
+            action='store_true',
+            help='Rebuild even if retention has removed pull request events, losing their history.'
+        )
+
+    def handle(self, *args, **options):
+        pull_requests = Event.objects.filter(event_type__event_type=EventTypes.PullRequestEvent.value)
+        folded = EventHourlyAggregate.objects.filter(event_type__event_type=EventTypes.PullRequestEvent.value)
+        stats = PullRequestStats.objects.all()
+        if options['repos']:
+            pull_requests = pull_requests.filter(repo__gh_repo_id__in=options['repos'])
+            folded = folded.filter(repo__gh_repo_id__in=options['repos'])
+            stats = stats.filter(repo__gh_repo_id__in=options['repos'])
+
+        if folded.exists():
+            if not options['allow_truncated']:
+                raise CommandError(
+                    'Retention has removed pull request events, which the rebuilt statistics would not cover. '
+                    'Pass --allow-truncated to rebuild them from the remaining events anyway.'
+                )
+            self.stderr.write(
+                'Retention has removed pull request events; the statistics only cover the remaining events.'
+            )
+
+        with transaction.atomic():
+            # Locked in the same order as by the parser
+            stale_repository_ids = set(stats.select_for_update().order_by('repo_id').values_list('repo_id', flat=True))
+            rebuilt = [
+                PullRequestStats(
+                    repo_id=row['repo'], count=row['count'], first_at=row['first_at'], last_at=row['last_at']
+                )
+                for row in pull_requests.order_by().values('repo').annotate(
+                    count=Count('id'), first_at=Min('created_at'), last_at=Max('created_at')
+                ).order_by('repo')
+            ]
+            PullRequestStats.objects.bulk_create(
+                rebuilt,
+                update_conflicts=True,
+                unique_fields=['repo'],
+                update_fields=['count', 'first_at', 'last_at']
+            )
+            stale_repository_ids -= {repo_stats.repo_id for repo_stats in rebuilt}
+            reset = PullRequestStats.objects.filter(repo_id__in=stale_repository_ids) \
+                .update(count=0, first_at=None, last_at=None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt pull request statistics of {len(rebuilt)} repositories '
+            f'({reset} without pull request events reset).'
+        ))
@@ -0,0 +1,263 @@
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+
+from checker.ingest_state import RecentCounts
+from checker.ingestion import INGEST_PHASE_SECONDS, GHParser, GHPoller, RateLimitExceededError
+from checker.instrumentation import start_http_server
+from checker.spool import EventSpool
+
+
+class Command(BaseCommand):
+    """
+    Management command that runs the GitHub events parser as a long-running process.
+
+    Polling and database writing run on an asyncio event loop and are connected by a spool
+    (see `checker.spool.EventSpool`): the fetcher adds the recognized events of every poll to the
+    spool and immediately schedules the next poll, while the writer saves the spooled events in
+    batches of up to `--write-batch-events` events in its own thread. A slow database therefore
+    never delays the next poll. The spool keeps up to `--max-memory-events` events in memory and
+    appends further events to the spool file, so the parser keeps polling while the database is
+    unavailable; the writer retries with an exponential backoff until the database is back.
+    Events left in the spool file by a stopped or crashed parser are written when it is started again.
+
+    The parser also keeps the event counts of the last `settings.RECENT_COUNTS_HOURS` hours in
+    memory and publishes them to the cache, from which recent time window counts are answered.
+
+    On SIGTERM (or SIGINT) the fetcher stops, the spooled events are written to the database and
+    the command exits. If the database is unavailable at that time, or the command fails, the events
+    in memory are moved to the spool file instead. A failed poll or batch is reported and retried, and
+    the parser also starts while the database is unavailable; the recent event counts are then loaded
+    before the first batch is saved.
+
+    With `--metrics-port` the instrumentation metrics of the parser (fetch latency, batch sizes,
+    dropped event types, rate limit headroom, ingestion phases, spooled events) are served in the
+    Prometheus text format, by default on the loopback address only (`--metrics-address`).
+
+    Note: Events in memory are lost if the process is killed (e.g. by SIGKILL); with
+    `--max-memory-events 0` every poll is written to the spool file first.
+
+    Usage:
+        python manage.py run_parser [--token TOKEN [--token TOKEN ...]] [--min-interval SECONDS]
+                                    [--metrics-port PORT] [--metrics-address ADDRESS] [--spool PATH]
+                                    [--max-memory-events N] [--write-batch-events N]
+    """
+    help = 'Polls the GitHub events feed and saves new events to the database until it is stopped.'
+    MAX_RETRY_DELAY = 60  # Seconds
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--token',
+            action='append',
+            dest='tokens',
+            help='GitHub API token, may be repeated (default: settings.GITHUB_TOKENS).'
+        )
+        parser.add_argument(
+            '--min-interval',
+            type=float,
+            default=settings.PARSER_MIN_INTERVAL,
+            help='Minimal number of seconds between two polls (default: settings.PARSER_MIN_INTERVAL).'
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=settings.PARSER_METRICS_PORT,
+            help='Port on which the metrics are served (default: settings.PARSER_METRICS_PORT, not served).'
+        )
+        parser.add_argument(
+            '--metrics-address',
+            default=settings.PARSER_METRICS_ADDRESS,
+            help='Address on which the metrics are served (default: settings.PARSER_METRICS_ADDRESS).'
+        )
+        parser.add_argument(
+            '--spool',
+            default=settings.PARSER_SPOOL_PATH,
+            help='Path of the spool file (default: settings.PARSER_SPOOL_PATH).'
+        )
+        parser.add_argument(
+            '--max-memory-events',
+            type=int,
+            default=settings.PARSER_MAX_MEMORY_EVENTS,
+            help='Events kept in memory before they are spooled to disk (default: settings.PARSER_MAX_MEMORY_EVENTS).'
+        )
+        parser.add_argument(
+            '--write-batch-events',
+            type=int,
+            default=settings.PARSER_WRITE_BATCH_EVENTS,
+            help='Maximal events saved per transaction (default: settings.PARSER_WRITE_BATCH_EVENTS).'
+        )
+
+    def handle(self, *args, **options):
+        tokens = options['tokens'] or settings.GITHUB_TOKENS
+        if not tokens:
+            raise CommandError('No GitHub token configured. Set GITHUB_TOKENS or pass --token.')
+        # Unlike the web workers, the parser keeps its connection open between batches
+        for database in connections.settings.values():
+            database['CONN_MAX_AGE'] = settings.PARSER_CONN_MAX_AGE
+        if options['metrics_port'] is not None:
+            start_http_server(options['metrics_port'], options['metrics_address'])
+            self.stdout.write(f'Serving metrics on {options["metrics_address"]}:{options["metrics_port"]}.')
+        spool = EventSpool(options['spool'], options['max_memory_events'])
+        if len(spool):
+            self.stdout.write(f'Replaying {len(spool)} spooled event(-s) from {spool.path}.')
+        asyncio.run(self._run(tokens, options['min_interval'], spool, options['write_batch_events']))
+
+    async def _run(self, tokens, min_interval: float, spool: EventSpool, write_batch_events: int):
+        """
+        Runs the fetcher and the writer until a termination signal is received.
+
+        :param tokens: The list of GitHub API tokens.
+        :param min_interval: The minimal number of seconds between two polls.
+        :param spool: The spool connecting the fetcher and the writer.
+        :param write_batch_events: The maximal number of events saved per transaction.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+
+        try:
+            GHParser.recent_counts = await loop.run_in_executor(None, self._load_recent_counts)
+        except DatabaseError as e:
+            self.stderr.write(f'Loading the recent event counts failed, they are loaded with the first batch: {e}')
+
+        available = asyncio.Event()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='parser-writer') as write_executor, \
+                GHPoller(tokens, settings.GITHUB_EVENTS_URL, min_interval) as poller:
+            writer = asyncio.create_task(self._write(spool, available, stopping, write_executor, write_batch_events))
+            try:
+                await self._fetch(poller, spool, available, stopping)
+
+                self.stdout.write(f'Stopping, writing {len(spool)} spooled event(-s)...')
+                available.set()
+                await writer
+            finally:
+                writer.cancel()
+                # The executor runs a pending save first, so the writer holds no batch of the spool anymore
+                await asyncio.shield(loop.run_in_executor(write_executor, spool.spill))
+                if len(spool):
+                    self.stderr.write(
+                        f'{len(spool)} event(-s) are kept in {spool.path} and will be written '
+                        f'when the parser is started again.'
+                    )
+        self.stdout.write('Parser stopped.')
+
+    async def _fetch(self, poller: GHPoller, spool: EventSpool, available: asyncio.Event, stopping: asyncio.Event):
+        """
+        Polls the events feed and spools recognized events until `stopping` is set.
+
+        :param poller: The poller used to fetch the events feed.
+        :param spool: The spool of event batches consumed by the writer.
+        :param available: The event that is set when events have been spooled.
+        :param stopping: The event that is set when the parser has to stop.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        while not stopping.is_set():
+            try:
+                with INGEST_PHASE_SECONDS.time(phase='fetch'):
+                    events = await loop.run_in_executor(None, poller.fetch)
+            except RateLimitExceededError as e:
+                self.stderr.write(str(e))
+            except requests.RequestException as e:
+                self.stderr.write(f'Fetching events failed: {e}')
+            except Exception as e:
+                self.stderr.write(f'Fetching events failed unexpectedly: {e!r}')
+            else:
+                try:
+                    with INGEST_PHASE_SECONDS.time(phase='process'):
+                        processed_events = [
+                            processed for processed in map(GHParser._process_event, events) if processed is not None
+                        ]
+                except Exception as e:
+                    self.stderr.write(f'Processing the fetched events failed: {e!r}')
+                else:
+                    if processed_events:
+                        spool.put(processed_events)
+                        available.set()
+
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=poller.next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _write(self, spool: EventSpool, available: asyncio.Event, stopping: asyncio.Event,
+                     executor: ThreadPoolExecutor, write_batch_events: int):
+        """
+        Saves spooled events to the database until the spool is empty after `stopping` has been set.
+
+        A batch that fails (e.g. while the database is unavailable) is kept in the spool and retried with
+        an exponential backoff, while the fetcher keeps spooling. If it still fails when the parser stops,
+        the writer returns and `_run` moves the events to the spool file.
+
+        :param spool: The spool of event batches produced by the fetcher.
+        :param available: The event that is set when events have been spooled.
+        :param stopping: The event that is set when the parser has to stop.
+        :param executor: The single-thread executor in which the database and the spool file are accessed.
+        :param write_batch_events: The maximal number of events saved per transaction.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        retry_delay = 0
+        while True:
+            processed_events, receipt = await loop.run_in_executor(executor, spool.peek, write_batch_events)
+            if receipt is None:
+                if stopping.is_set():
+                    return
+                available.clear()
+                if not len(spool):
+                    await available.wait()
+                continue
+
+            try:
+                await loop.run_in_executor(executor, self._save, processed_events)
+            except Exception as e:
+                if stopping.is_set():
+                    self.stderr.write(f'Saving {len(processed_events)} event(-s) failed: {e!r}')
+                    return
+                retry_delay = min(max(retry_delay * 2, 1), self.MAX_RETRY_DELAY)
+                self.stderr.write(
+                    f'Saving {len(processed_events)} event(-s) failed, retrying in {retry_delay}s '
+                    f'({len(spool)} event(-s) spooled): {e!r}'
+                )
+                try:
+                    await asyncio.wait_for(stopping.wait(), timeout=retry_delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            retry_delay = 0
+            await loop.run_in_executor(executor, spool.commit, receipt)
+
+    @staticmethod
+    def _load_recent_counts():
+        """
+        Creates the buffer of recent event counts from the database and publishes it.
+
+        :return: The `RecentCounts` instance.
+        """
+        recent_counts = RecentCounts.from_database(settings.RECENT_COUNTS_HOURS)
+        recent_counts.publish()
+        close_old_connections()
+        return recent_counts
+
+    @staticmethod
+    def _save(processed_events):
+        """
+        Saves one batch of processed events, replacing a broken or expired database connection first.
+
+        The recent event counts are loaded first if they could not be loaded at startup.
+
+        :param processed_events: A list of tuples returned by `GHParser._process_event`.
+        :return: The number of saved events.
+        """
+        close_old_connections()
+        if GHParser.recent_counts is None:
+            GHParser.recent_counts = Command._load_recent_counts()
+        return GHParser.save_events(processed_events)
@@ -1,6 +1,7 @@
-from django.db import models
+from datetime import timedelta
 
-from .validators import validate_respond_structure
+from django.db import models
+from django.utils import timezone
 
 
 class Repository(models.Model):
@@ -58,9 +59,10 @@ class Event(models.Model):
     Model class representing GitHub events.
 
     Fields:
+    - gh_event_id (BigIntegerField): The GitHub event ID, used to skip events that are already stored.
     - event_type (ForeignKey): The foreign key reference to the EventType model.
     - repo (ForeignKey): The foreign key reference to the Repository model.
-    - created_at (DateTimeField): The timestamp when the event was created.
+    - created_at (DateTimeField): The timestamp when the event was created on GitHub.
 
     Methods:
     - __str__(): Returns a string representation of the event.
@@ -68,10 +70,15 @@ class Event(models.Model):
     Meta:
     - verbose_name: The human-readable singular name for the model.
     - verbose_name_plural: The human-readable plural name for the model.
+    - indexes: Composite indexes matching the time window and per-repository queries.
+
+    Note: The table can be converted into daily PostgreSQL partitions with
+    `python manage.py event_partitions setup`.
     """
+    gh_event_id = models.BigIntegerField(unique=True, null=True)
     event_type = models.ForeignKey(EventType, on_delete=models.PROTECT)
     repo = models.ForeignKey(Repository, on_delete=models.PROTECT)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f'{self.event_type} at {self.created_at}'
@@ -79,34 +86,136 @@ class Event(models.Model):
     class Meta:
         verbose_name = 'Event'
         verbose_name_plural = 'Events'
+        indexes = [
+            # Time window counts grouped by event type
+            models.Index(fields=['created_at', 'event_type'], name='event_created_type_idx'),
+            # Events of one repository and event type ordered by time
+            models.Index(fields=['repo', 'event_type', 'created_at'], name='event_repo_type_created_idx'),
+        ]
 
 
-class PullRequestMetrics(models.Model):
+class EventRollup(models.Model):
     """
-    Model class representing pull request metrics.
+    Model class representing the number of events of one event type created within one minute.
+
+    The rollups are updated by the parser in the same transaction in which the events are saved,
+    so time window counts can be summed from at most one row per minute and event type.
 
     Fields:
-    - gh_repo_id (ForeignKey): The foreign key reference to the Repository model.
-    - respond (CharField): The response time in the format "<int> days, <int:2>:<int:2>:<int:2>".
+    - minute (DateTimeField): The start of the minute (truncated creation time of the events).
+    - event_type (ForeignKey): The foreign key reference to the EventType model.
+    - count (BigIntegerField): The number of events.
 
     Methods:
-    - __str__(): Returns a string representation of the pull request metric.
+    - __str__(): Returns a string representation of the rollup.
 
     Meta:
     - verbose_name: The human-readable singular name for the model.
     - verbose_name_plural: The human-readable plural name for the model.
+    - constraints: One rollup per minute and event type.
+    """
+    minute = models.DateTimeField()
+    event_type = models.ForeignKey(EventType, on_delete=models.PROTECT)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.count} x {self.event_type} at {self.minute}'
+
+    class Meta:
+        verbose_name = 'Event Rollup'
+        verbose_name_plural = 'Event Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['minute', 'event_type'], name='event_rollup_minute_type_uniq'),
+        ]
+
+
+class EventHourlyAggregate(models.Model):
     """
-    gh_repo_id = models.ForeignKey('Repository', on_delete=models.PROTECT)
-    respond = models.CharField(
-        max_length=50,
-        default=None,
-        validators=[validate_respond_structure],
-        help_text='The response time in the format "<int> days, <int:2>:<int:2>:<int:2>".'
-    )
+    Model class representing the number of events of one repository and event type created within one hour.
+
+    Raw events older than the retention period are folded into the hourly aggregates before they are
+    deleted (see `python manage.py apply_retention`), so per-repository counts of old time ranges
+    are still available at hourly resolution.
+
+    Fields:
+    - hour (DateTimeField): The start of the hour (truncated creation time of the events).
+    - repo (ForeignKey): The foreign key reference to the Repository model.
+    - event_type (ForeignKey): The foreign key reference to the EventType model.
+    - count (BigIntegerField): The number of events.
+
+    Methods:
+    - __str__(): Returns a string representation of the aggregate.
+
+    Meta:
+    - verbose_name: The human-readable singular name for the model.
+    - verbose_name_plural: The human-readable plural name for the model.
+    - constraints: One aggregate per hour, repository and event type.
+    - indexes: Aggregates of one repository ordered by time.
+    """
+    hour = models.DateTimeField()
+    repo = models.ForeignKey(Repository, on_delete=models.PROTECT)
+    event_type = models.ForeignKey(EventType, on_delete=models.PROTECT)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.count} x {self.event_type} in repo {self.repo_id} at {self.hour}'
+
+    class Meta:
+        verbose_name = 'Event Hourly Aggregate'
+        verbose_name_plural = 'Event Hourly Aggregates'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'repo', 'event_type'], name='event_hourly_hour_repo_type_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['repo', 'hour'], name='event_hourly_repo_hour_idx'),
+        ]
+
+
+class PullRequestStats(models.Model):
+    """
+    Model class representing running statistics of the intervals between pull request events of a repository.
+
+    The statistics are updated by the parser in the same transaction in which the events are saved,
+    so the average interval can be read from one row instead of being computed from all events:
+    it only depends on the number of events and the first and the last creation time.
+
+    Fields:
+    - repo (OneToOneField): The one-to-one reference to the Repository model.
+    - count (BigIntegerField): The number of pull request events.
+    - first_at (DateTimeField): The creation time of the first pull request event.
+    - last_at (DateTimeField): The creation time of the last pull request event.
+
+    Methods:
+    - add_event(created_at): Accounts a new pull request event in the statistics.
+    - average_interval(): Returns the average interval between consecutive events as a timedelta.
+    - __str__(): Returns a string representation of the statistics.
+
+    Meta:
+    - verbose_name: The human-readable singular name for the model.
+    - verbose_name_plural: The human-readable plural name for the model.
+    """
+    repo = models.OneToOneField(Repository, on_delete=models.PROTECT, related_name='pull_request_stats')
+    count = models.BigIntegerField(default=0)
+    first_at = models.DateTimeField(null=True)
+    last_at = models.DateTimeField(null=True)
+
+    def add_event(self, created_at):
+        """
+        Accounts a new pull request event in the running statistics.
+
+        :param created_at: The creation time of the new event.
+        :return: None
+        """
+        self.first_at = created_at if self.first_at is None else min(self.first_at, created_at)
+        self.last_at = created_at if self.last_at is None else max(self.last_at, created_at)
+        self.count += 1
+
+    def average_interval(self):
+        return (self.last_at - self.first_at) / (self.count - 1) if self.count > 1 else timedelta(0)
 
     def __str__(self):
-        return f'Pull request metric about repo {self.gh_repo_id} = {self.respond}'
+        return f'Pull request stats about repo {self.repo_id}: {self.count} events'
 
     class Meta:
-        verbose_name = 'Pull Request Metric'
-        verbose_name_plural = 'Pull Request Metrics'
+        verbose_name = 'Pull Request Stats'
+        verbose_name_plural = 'Pull Request Stats'
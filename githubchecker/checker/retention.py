@@ -0,0 +1,122 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+
+from .models import Event, EventHourlyAggregate
+
+
+class EventRetention:
+    """
+    The EventRetention class folds raw events into hourly per-repository aggregates and deletes them.
+
+    Every batch of raw events is added to the `EventHourlyAggregate` rows and deleted in the same short
+    transaction, so each event is counted exactly once, whether it is still stored or already folded,
+    and an interrupted run can simply be repeated.
+
+    Methods:
+    - fold_batch(cutoff, position, batch_size):
+        Folds and deletes the oldest batch of events created before `cutoff`, starting at `position`.
+    - fold(events):
+        Adds the events of a queryset to the hourly aggregates without deleting them.
+
+    Note: This class does not need to be instantiated, as all its methods are static.
+    """
+    BATCH_SIZE = 5000
+
+    @staticmethod
+    def fold_batch(cutoff, position=None, batch_size: int = BATCH_SIZE):
+        """
+        Folds the oldest batch of events created before `cutoff` into the hourly aggregates and deletes them.
+
+        Batches are paginated by creation time: passing the returned position to the next call continues
+        after the deleted events, so the index entries of already deleted events are not scanned again.
+        Rows locked by a concurrent run are skipped.
+
+        :param cutoff: The creation time before which events are folded and deleted.
+        :param position: The position returned by the previous call, or None to start with the oldest event.
+        :param batch_size: The maximal number of events folded and deleted.
+        :return: A tuple of (the number of deleted events, the position of the next batch).
+        """
+        events = Event.objects.filter(created_at__lt=cutoff)
+        if position is not None:
+            events = events.filter(created_at__gte=position)
+
+        with transaction.atomic():
+            rows = list(
+                events.select_for_update(skip_locked=True)
+                .order_by('created_at')
+                .values_list('id', 'created_at', 'repo_id', 'event_type_id')[:batch_size]
+            )
+            if not rows:
+                return 0, position
+
+            EventRetention.__add_counts(Counter(
+                (created_at.replace(minute=0, second=0, microsecond=0), repo_id, event_type_id)
+                for _, created_at, repo_id, event_type_id in rows
+            ))
+            Event.objects.filter(created_at__lt=cutoff, id__in=[pk for pk, *_ in rows]).delete()
+        return len(rows), rows[-1][1]
+
+    @staticmethod
+    def fold(events):
+        """
+        Adds the events of a queryset to the hourly aggregates without deleting them.
+
+        The events are counted per hour, repository and event type by the database. The caller has to
+        remove the events within the same transaction (e.g. by dropping their partition).
+
+        :param events: A queryset of `Event` instances.
+        :return: The number of folded events.
+        """
+        groups = events.annotate(hour=TruncHour('created_at')) \
+            .values_list('hour', 'repo_id', 'event_type_id') \
+            .annotate(count=Count('id')) \
+            .order_by()
+
+        folded = 0
+        counts = {}
+        for hour, repo_id, event_type_id, count in groups.iterator(chunk_size=EventRetention.BATCH_SIZE):
+            counts[(hour, repo_id, event_type_id)] = count
+            if len(counts) >= EventRetention.BATCH_SIZE:
+                EventRetention.__add_counts(counts)
+                folded += sum(counts.values())
+                counts = {}
+        EventRetention.__add_counts(counts)
+        return folded + sum(counts.values())
+
+    @staticmethod
+    def __add_counts(counts):
+        """
+        Private helper method that adds event counts to the hourly aggregates.
+
+        Missing aggregates are created with a single statement and the affected aggregates are then
+        incremented with one update per distinct increment, like the per-minute rollups.
+
+        :param counts: A dictionary mapping (hour, repository pk, event type pk) tuples to event counts.
+        :return: None
+        """
+        if not counts:
+            return
+
+        EventHourlyAggregate.objects.bulk_create(
+            [
+                EventHourlyAggregate(hour=hour, repo_id=repo_id, event_type_id=event_type_id)
+                for hour, repo_id, event_type_id in counts
+            ],
+            ignore_conflicts=True
+        )
+        aggregate_ids = {
+            (hour, repo_id, event_type_id): pk
+            for pk, hour, repo_id, event_type_id in EventHourlyAggregate.objects.filter(
+                hour__in={hour for hour, _, _ in counts},
+                repo_id__in={repo_id for _, repo_id, _ in counts},
+                event_type_id__in={event_type_id for _, _, event_type_id in counts}
+            ).values_list('pk', 'hour', 'repo_id', 'event_type_id')
+        }
+        increments = defaultdict(list)
+        for key, count in counts.items():
+            increments[count].append(aggregate_ids[key])
+        for count, pks in increments.items():
+            EventHourlyAggregate.objects.filter(pk__in=pks).update(count=F('count') + count)
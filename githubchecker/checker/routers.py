@@ -0,0 +1,214 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import isasyncgenfunction, isgeneratorfunction
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .instrumentation import REGISTRY
+
+REPLICA_DATABASE = 'replica'
+
+REPLICA_LAG_SECONDS = REGISTRY.gauge(
+    'checker_replica_lag_seconds', 'Last measured replication lag of the read replica (-1 if unreachable).'
+)
+
+# Whether the reads of the current call may be served by the replica
+_replica_reads = ContextVar('checker_replica_reads', default=False)
+# The aliases of the databases that served the reads of the current call, if they are tracked
+_served_reads = ContextVar('checker_served_reads', default=None)
+
+_lag_lock = Lock()
+_lag = {'checked_at': None, 'seconds': None, 'replayed_until': None}
+
+
+def replica_lag():
+    """
+    Returns the replication lag of the read replica in seconds.
+
+    The lag is measured at most every `settings.REPLICA_LAG_CHECK_INTERVAL` seconds per process. A replica
+    that streams from the primary and has replayed all received changes has no lag, even if the primary has
+    not written for a while. A replica whose WAL receiver is not streaming (e.g. it lost the connection to
+    the primary) falls behind without limit, so its lag is infinite; reading `pg_stat_wal_receiver` requires
+    the `pg_read_all_stats` role. A database that is not in recovery (e.g. a second alias of the primary in
+    development) or is not PostgreSQL is treated as not lagging. In an async context, where the database
+    cannot be queried, the last measured lag is returned.
+
+    :return: The lag in seconds, or None if the replica is not configured or cannot be reached.
+    """
+    if REPLICA_DATABASE not in settings.DATABASES:
+        return None
+    with _lag_lock:
+        checked_at = _lag['checked_at']
+        if checked_at is not None and time.monotonic() - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return _lag['seconds']
+        _lag['checked_at'] = time.monotonic()
+
+    connection = connections[REPLICA_DATABASE]
+    lag = None
+    try:
+        if connection.vendor != 'postgresql':
+            lag = 0.0
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_is_in_recovery() '
+                    'AND NOT EXISTS (SELECT FROM pg_stat_wal_receiver WHERE status = %s), '
+                    'CASE WHEN NOT pg_is_in_recovery() '
+                    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END',
+                    ['streaming']
+                )
+                disconnected, seconds = cursor.fetchone()
+                lag = math.inf if disconnected else float(seconds or 0)
+    except SynchronousOnlyOperation:
+        with _lag_lock:
+            _lag['checked_at'] = checked_at
+            return _lag['seconds']
+    except DatabaseError:
+        pass
+    with _lag_lock:
+        _lag['seconds'] = lag
+        _lag['replayed_until'] = None if lag is None else time.time() - lag
+    REPLICA_LAG_SECONDS.set(-1 if lag is None else lag)
+    return lag
+
+
+def replica_available():
+    """
+    Checks whether reads may be served by the read replica.
+
+    :return: True if the replica is configured, reachable and lags at most `settings.REPLICA_MAX_STALENESS` seconds.
+    """
+    lag = replica_lag()
+    return lag is not None and lag <= settings.REPLICA_MAX_STALENESS
+
+
+def replica_replayed(timestamp: float):
+    """
+    Checks whether the replica had replayed the changes committed on the primary until `timestamp`
+    when its lag was last measured.
+
+    :param timestamp: A UNIX timestamp, e.g. an ingest watermark.
+    :return: True if the changes committed until `timestamp` were visible on the replica.
+    """
+    with _lag_lock:
+        replayed_until = _lag['replayed_until']
+    return replayed_until is not None and replayed_until >= timestamp
+
+
+@contextmanager
+def track_reads():
+    """
+    Context manager collecting the aliases of the databases that serve the reads within its block,
+    including the reads of functions run by `sync_to_async`.
+
+    :return: A context manager yielding the set of database aliases.
+    """
+    databases = set()
+    token = _served_reads.set(databases)
+    try:
+        yield databases
+    finally:
+        _served_reads.reset(token)
+
+
+def reads_from_replica(function):
+    """
+    Decorator that lets the read replica serve the reads of the function (see `PrimaryReplicaRouter`).
+
+    Coroutine functions are covered until their coroutine completes, and generator functions (also
+    asynchronous ones) whenever they are resumed, so lazily consumed results are read from the replica too.
+
+    :param function: The function reading the database.
+    :return: The decorated function.
+    """
+    if isasyncgenfunction(function):
+        @wraps(function)
+        async def async_generator_wrapper(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    token = _replica_reads.set(True)
+                    try:
+                        item = await generator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _replica_reads.reset(token)
+                    yield item
+            finally:
+                await generator.aclose()
+        return async_generator_wrapper
+
+    if isgeneratorfunction(function):
+        @wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    token = _replica_reads.set(True)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        _replica_reads.reset(token)
+                    yield item
+            finally:
+                generator.close()
+        return generator_wrapper
+
+    if iscoroutinefunction(function):
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            token = _replica_reads.set(True)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router that sends analytics reads to the read replica and everything else to the primary.
+
+    Reads are routed to the `replica` database only within functions decorated with `reads_from_replica`
+    (the `Analyzer` queries and the event export, which serve the metrics views) and only while the
+    replica lags at most `settings.REPLICA_MAX_STALENESS` seconds; otherwise they fall back to the primary.
+    Writes (e.g. of `GHParser`) always go to the primary, and migrations are only applied to the primary,
+    which the replica mirrors.
+    """
+
+    def db_for_read(self, model, **hints):
+        database = REPLICA_DATABASE if _replica_reads.get() and replica_available() else DEFAULT_DB_ALIAS
+        served_reads = _served_reads.get()
+        if served_reads is not None:
+            served_reads.add(database)
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return obj1._state.db in (DEFAULT_DB_ALIAS, REPLICA_DATABASE) \
+            and obj2._state.db in (DEFAULT_DB_ALIAS, REPLICA_DATABASE)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,225 @@
+import json
+import os
+from collections import deque
+from threading import Lock
+
+from django.utils.dateparse import parse_datetime
+
+from .ingestion import EventTypes
+from .instrumentation import REGISTRY
+
+SPOOLED_EVENTS = REGISTRY.gauge(
+    'checker_spool_events', 'Events waiting to be written, in memory or in the spool file.', ('location', )
+)
+
+
+class EventSpool:
+    """
+    The EventSpool class buffers batches of processed events between the fetcher and the writer of the parser.
+
+    Batches are kept in a bounded in-memory queue. When the queue holds `max_memory_events` events, further
+    batches are appended to a local spool file instead, and keep being appended to it until the writer has
+    drained the file, so batches are always written in the order they were fetched. Every appended batch is
+    flushed to disk, and the position of the first batch that has not been written to the database is kept
+    in a separate offset file, so batches spooled before a crash or a restart are replayed when the spool is
+    opened again. A batch can be replayed after it has been written if the process stops in between, which
+    `GHParser.save_events` tolerates, as it skips stored events.
+
+    The spool is safe to use from the fetcher and the writer threads at the same time; there must be only
+    one writer.
+
+    Methods:
+    - put(processed_events):
+        Adds a batch of processed events to the spool.
+    - peek(max_events):
+        Returns the oldest batches, up to `max_events` events, without removing them.
+    - commit(receipt):
+        Removes the batches returned by `peek` after they have been written.
+    - spill():
+        Moves the batches of the in-memory queue to the spool file, e.g. before the process exits.
+    - __len__():
+        Returns the number of events in the spool.
+    """
+    MAX_MEMORY_EVENTS = 10000
+
+    def __init__(self, path, max_memory_events: int = MAX_MEMORY_EVENTS):
+        """
+        Opens the spool, keeping the batches a previous process has left in the spool file.
+
+        :param path: The path of the spool file. The offset file is stored next to it.
+        :param max_memory_events: The maximal number of events in the in-memory queue.
+        """
+        self.path = str(path)
+        self.offset_path = f'{self.path}.offset'
+        self.max_memory_events = max_memory_events
+        self._lock = Lock()
+        self._memory = deque()
+        self._memory_events = 0
+        self._offset = 0
+        self._disk_events = 0
+        self._recover()
+
+    def __len__(self):
+        with self._lock:
+            return self._memory_events + self._disk_events
+
+    def put(self, processed_events):
+        """
+        Adds a batch of processed events to the spool.
+
+        :param processed_events: A list of tuples returned by `GHParser._process_event`.
+        :return: None
+        """
+        with self._lock:
+            if self._disk_events or self._memory_events + len(processed_events) > self.max_memory_events:
+                self._append(processed_events)
+            else:
+                self._memory.append(processed_events)
+                self._memory_events += len(processed_events)
+            self._publish()
+
+    def peek(self, max_events: int):
+        """
+        Returns the oldest batches, up to `max_events` events (but at least one batch), without removing them.
+
+        :param max_events: The maximal number of events returned, unless the oldest batch is larger.
+        :return: A tuple of (a list of processed events, a receipt to pass to `commit`),
+                 or (an empty list, None) if the spool is empty.
+        """
+        with self._lock:
+            if self._memory:
+                events, batches = [], 0
+                for batch in self._memory:
+                    if events and len(events) + len(batch) > max_events:
+                        break
+                    events.extend(batch)
+                    batches += 1
+                return events, ('memory', batches, len(events))
+            if not self._disk_events:
+                return [], None
+            offset = self._offset
+
+        events = []
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # A batch that is being appended
+                    break
+                batch = [self.__decode(event) for event in json.loads(line)]
+                if events and len(events) + len(batch) > max_events:
+                    break
+                events.extend(batch)
+                offset += len(line)
+        return events, ('disk', offset, len(events))
+
+    def commit(self, receipt):
+        """
+        Removes the batches returned by `peek` after they have been written.
+
+        The spool file is emptied once all of its batches have been written.
+
+        :param receipt: The receipt returned by `peek`.
+        :return: None
+        """
+        location, position, count = receipt
+        with self._lock:
+            if location == 'memory':
+                for _ in range(position):
+                    self._memory.popleft()
+                self._memory_events -= count
+            else:
+                self._disk_events -= count
+                # The offset is written first, so a crash in between replays batches instead of skipping them
+                self._offset = position if self._disk_events else 0
+                self._write_offset()
+                if not self._disk_events:
+                    os.truncate(self.path, 0)
+            self._publish()
+
+    def spill(self):
+        """
+        Moves the batches of the in-memory queue to the spool file, ahead of the batches already in it.
+
+        The writer must not hold a receipt of `peek` (e.g. it has stopped).
+
+        :return: None
+        """
+        with self._lock:
+            if not self._memory:
+                return
+            pending = b''
+            if self._disk_events:
+                with open(self.path, 'rb') as file:
+                    file.seek(self._offset)
+                    pending = file.read()
+            with open(f'{self.path}.tmp', 'wb') as file:
+                for batch in self._memory:
+                    file.write(self.__encode(batch))
+                file.write(pending)
+                file.flush()
+                os.fsync(file.fileno())
+            self._offset = 0
+            self._write_offset()
+            os.replace(f'{self.path}.tmp', self.path)
+            self._disk_events += self._memory_events
+            self._memory.clear()
+            self._memory_events = 0
+            self._publish()
+
+    def _recover(self):
+        """
+        Reads the offset and counts the unwritten events of the spool file, dropping an incompletely written
+        last batch.
+
+        :return: None
+        """
+        try:
+            with open(self.offset_path) as file:
+                self._offset = int(file.read() or 0)
+        except FileNotFoundError:
+            self._offset = 0
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+        if self._offset > os.path.getsize(self.path):
+            self._offset = 0
+
+        end = self._offset
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                self._disk_events += len(json.loads(line))
+                end += len(line)
+        if end < os.path.getsize(self.path):
+            os.truncate(self.path, end)
+        self._publish()
+
+    def _append(self, batch):
+        with open(self.path, 'ab') as file:
+            file.write(self.__encode(batch))
+            file.flush()
+            os.fsync(file.fileno())
+        self._disk_events += len(batch)
+
+    def _write_offset(self):
+        with open(f'{self.offset_path}.tmp', 'w') as file:
+            file.write(str(self._offset))
+        os.replace(f'{self.offset_path}.tmp', self.offset_path)
+
+    def _publish(self):
+        SPOOLED_EVENTS.set(self._memory_events, location='memory')
+        SPOOLED_EVENTS.set(self._disk_events, location='disk')
+
+    @staticmethod
+    def __encode(batch):
+        return json.dumps([
+            [event_id, event_type.value, repo_id, repo_name, created_at.isoformat()]
+            for event_id, event_type, repo_id, repo_name, created_at in batch
+        ]).encode() + b'\n'
+
+    @staticmethod
+    def __decode(event):
+        event_id, event_type, repo_id, repo_name, created_at = event
+        return event_id, EventTypes(event_type), repo_id, repo_name, parse_datetime(created_at)
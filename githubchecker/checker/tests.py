@@ -1,3 +1,788 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import routers
+from .analytics import Analyzer, NotInDataBase
+from .ingest_state import IngestWatermark, RecentCounts
+from .ingestion import EventTypes, GHParser, GHPoller, RateLimitExceededError, TokenPool
+from .models import Event, EventHourlyAggregate, EventRollup, EventType, PullRequestStats, Repository
+from .retention import EventRetention
+from .routers import REPLICA_DATABASE, PrimaryReplicaRouter, reads_from_replica, replica_replayed, track_reads
+from .spool import EventSpool
+
+
+LOCAL_MEMORY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _reset_parser():
+    """
+    Forgets the in-process state of `GHParser`, whose cached database ids do not survive the rollback of a test.
+    """
+    GHParser._repository_ids.clear()
+    GHParser._event_type_ids.clear()
+    GHParser._seen_event_ids.clear()
+    GHParser.recent_counts = None
+
+
+def _event(event_id: int, event_type: str = 'WatchEvent', repo_id: int = 1):
+    return {
+        'id': str(event_id),
+        'type': event_type,
+        'repo': {'id': repo_id, 'name': f'owner/repo-{repo_id}'},
+        'created_at': '2024-01-01T00:00:00Z',
+    }
+
+
+class StubEventsFeedHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of a local stub of the GitHub events feed.
+
+    The served pages, the ETag, the extra response headers, the failing pages and the exhausted tokens
+    are configured on the server, which also records the page, the token and the `If-None-Match`
+    header of every request.
+    """
+
+    def do_GET(self):
+        server = self.server
+        page = int(parse_qs(urlparse(self.path).query)['page'][0])
+        token = self.headers.get('Authorization')
+        server.requests.append((page, token, self.headers.get('If-None-Match')))
+
+        if token in server.exhausted_tokens:
+            self._respond(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 3600)})
+        elif page in server.failing_pages:
+            self._respond(500)
+        elif page == 1 and self.headers.get('If-None-Match') == server.etag:
+            self._respond(304, {'ETag': server.etag, **server.extra_headers})
+        else:
+            headers = {'ETag': server.etag, **server.extra_headers}
+            if len(server.pages) > 1:
+                url = f'http://127.0.0.1:{server.server_port}/events'
+                headers['Link'] = f'<{url}?page={page + 1}>; rel="next", <{url}?page={len(server.pages)}>; rel="last"'
+            self._respond(200, headers, json.dumps(server.pages[page - 1]).encode())
+
+    def _respond(self, status: int, headers=None, body: bytes = b''):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GHPollerTests(TestCase):
+    """
+    Tests of `GHPoller` against a local stub of the GitHub events feed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubEventsFeedHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.events_url = f'http://127.0.0.1:{cls.server.server_port}/events'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.pages = [[_event(3), _event(2)], [_event(2), _event(1)]]
+        self.server.etag = '"first"'
+        self.server.extra_headers = {}
+        self.server.failing_pages = set()
+        self.server.exhausted_tokens = set()
+        self.server.requests = []
+        _reset_parser()
+        self.addCleanup(_reset_parser)
+
+    def test_fetch_merges_all_pages_without_duplicates(self):
+        with GHPoller('token', self.events_url) as poller:
+            events = poller.fetch()
+
+        self.assertEqual([event['id'] for event in events], ['3', '2', '1'])
+        self.assertEqual(sorted(page for page, _, _ in self.server.requests), [1, 2])
+        self.assertEqual(poller.etag, '"first"')
+
+    def test_fetch_stops_at_max_pages(self):
+        self.server.pages = [[_event(page)] for page in range(5, 0, -1)]
+
+        with GHPoller('token', self.events_url, max_pages=3) as poller:
+            events = poller.fetch()
+
+        self.assertEqual([event['id'] for event in events], ['5', '4', '3'])
+
+    def test_unchanged_feed_is_not_modified(self):
+        with GHPoller('token', self.events_url) as poller:
+            poller.fetch()
+            self.server.requests.clear()
+            events = poller.fetch()
+
+        self.assertEqual(events, [])
+        self.assertEqual(self.server.requests, [(1, 'token', '"first"')])
+
+    def test_failed_page_keeps_the_previous_etag(self):
+        self.server.failing_pages = {2}
+
+        with GHPoller('token', self.events_url) as poller:
+            with self.assertRaises(Exception):
+                poller.fetch()
+            self.assertIsNone(poller.etag)
+
+            self.server.failing_pages = set()
+            self.server.requests.clear()
+            events = poller.fetch()
+
+        self.assertEqual(self.server.requests[0], (1, 'token', None))
+        self.assertEqual(len(events), 3)
+
+    def test_poll_interval_and_rate_limit_slow_down_polling(self):
+        self.server.extra_headers = {
+            'X-Poll-Interval': '30',
+            'X-RateLimit-Remaining': '60',
+            'X-RateLimit-Reset': str(int(time.time()) + 3600),
+        }
+
+        with GHPoller('token', self.events_url) as poller:
+            poller.fetch()
+
+            self.assertEqual(poller.poll_interval, 30)
+            # 10 requests above the reserve are left for an hour
+            self.assertGreater(poller.next_delay(), 300)
+
+    def test_exhausted_token_is_replaced(self):
+        self.server.exhausted_tokens = {'exhausted'}
+
+        with GHPoller(['exhausted', 'token'], self.events_url) as poller:
+            events = poller.fetch()
+
+        self.assertEqual(len(events), 3)
+        self.assertEqual({token for _, token, _ in self.server.requests}, {'exhausted', 'token'})
+
+    def test_all_tokens_exhausted(self):
+        self.server.exhausted_tokens = {'exhausted'}
+
+        with GHPoller('exhausted', self.events_url) as poller:
+            with self.assertRaises(RateLimitExceededError):
+                poller.fetch()
+
+    def test_poll_saves_new_events_once(self):
+        self.server.pages = [[_event(2, 'PullRequestEvent'), _event(1, 'PushEvent')]]
+
+        with GHPoller('token', self.events_url) as poller:
+            self.assertEqual(poller.poll(), 1)
+            self.assertEqual(poller.poll(), 0)
+
+        self.assertEqual(list(Event.objects.values_list('gh_event_id', flat=True)), [2])
+
+
+class PrimaryReplicaRouterTests(TestCase):
+    """
+    Tests of `PrimaryReplicaRouter` and of the `reads_from_replica` decorator.
+    """
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        routers._lag.update(checked_at=None, seconds=None, replayed_until=None)
+
+    def _read(self):
+        return self.router.db_for_read(Event)
+
+    def test_reads_outside_the_decorator_go_to_the_primary(self):
+        with mock.patch('checker.routers.replica_lag', return_value=0.0):
+            self.assertEqual(self._read(), DEFAULT_DB_ALIAS)
+
+    def test_decorated_reads_go_to_the_replica(self):
+        @reads_from_replica
+        def read():
+            return self._read()
+
+        @reads_from_replica
+        async def aread():
+            return self._read()
+
+        @reads_from_replica
+        def reads():
+            yield self._read()
+            yield self._read()
+
+        with mock.patch('checker.routers.replica_lag', return_value=settings.REPLICA_MAX_STALENESS):
+            self.assertEqual(read(), REPLICA_DATABASE)
+            self.assertEqual(asyncio.run(aread()), REPLICA_DATABASE)
+            self.assertEqual(list(reads()), [REPLICA_DATABASE, REPLICA_DATABASE])
+            self.assertEqual(self._read(), DEFAULT_DB_ALIAS)
+
+    def test_generator_reads_between_items_go_to_the_primary(self):
+        @reads_from_replica
+        def reads():
+            yield self._read()
+
+        with mock.patch('checker.routers.replica_lag', return_value=0.0):
+            generator = reads()
+            self.assertEqual(next(generator), REPLICA_DATABASE)
+            self.assertEqual(self._read(), DEFAULT_DB_ALIAS)
+
+    def test_lagging_or_unreachable_replica_falls_back_to_the_primary(self):
+        read = reads_from_replica(self._read)
+        for lag in (settings.REPLICA_MAX_STALENESS + 1, math.inf, None):
+            with self.subTest(lag=lag), mock.patch('checker.routers.replica_lag', return_value=lag):
+                self.assertEqual(read(), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_migrations_go_to_the_primary(self):
+        with mock.patch('checker.routers.replica_lag', return_value=0.0):
+            self.assertEqual(reads_from_replica(self.router.db_for_write)(Event), DEFAULT_DB_ALIAS)
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'checker'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_DATABASE, 'checker'))
+
+    def test_track_reads_collects_the_serving_databases(self):
+        with mock.patch('checker.routers.replica_lag', return_value=0.0), track_reads() as databases:
+            reads_from_replica(self._read)()
+        self.assertEqual(databases, {REPLICA_DATABASE})
+
+        with mock.patch('checker.routers.replica_lag', return_value=None), track_reads() as databases:
+            reads_from_replica(self._read)()
+            self._read()
+        self.assertEqual(databases, {DEFAULT_DB_ALIAS})
+
+    def test_replica_replayed(self):
+        self.assertFalse(replica_replayed(0))
+
+        now = time.time()
+        routers._lag['replayed_until'] = now - 10
+        self.assertTrue(replica_replayed(now - 20))
+        self.assertFalse(replica_replayed(now))
+
+    @skipUnless(REPLICA_DATABASE not in settings.DATABASES, 'A replica database is configured.')
+    def test_missing_replica_has_no_lag(self):
+        self.assertIsNone(routers.replica_lag())
+
+
+@skipUnless(REPLICA_DATABASE in settings.DATABASES, 'No replica database is configured.')
+class PrimaryReplicaRouterDatabaseTests(TestCase):
+    """
+    Tests of `PrimaryReplicaRouter` with a configured replica database.
+    """
+    databases = {DEFAULT_DB_ALIAS, REPLICA_DATABASE} & set(settings.DATABASES)
+
+    def setUp(self):
+        routers._lag.update(checked_at=None, seconds=None, replayed_until=None)
+
+    def test_analytics_read_from_the_replica(self):
+        Repository.objects.create(name='owner/repo', gh_repo_id=1)
+
+        with CaptureQueriesContext(connections[REPLICA_DATABASE]) as replica_queries, \
+                CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary_queries:
+            self.assertIsInstance(Analyzer.get_average_pull_request(2), NotInDataBase)
+            Repository.objects.exists()
+
+        self.assertGreater(len(replica_queries), 0)
+        self.assertEqual(len(primary_queries), 1)
+
+
+def _processed_events(*event_ids: int):
+    created_at = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    return [
+        (event_id, EventTypes.WatchEvent, 1, 'owner/repo-1', created_at + timedelta(seconds=event_id))
+        for event_id in event_ids
+    ]
+
+
+class EventSpoolTests(TestCase):
+    """
+    Tests of `EventSpool`, including the replay of the spool file after a restart or a crash.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'events.spool')
+
+    def _drain(self, spool, max_events=100):
+        events = []
+        while True:
+            batch, receipt = spool.peek(max_events)
+            if receipt is None:
+                return events
+            events.extend(batch)
+            spool.commit(receipt)
+
+    def test_batches_are_kept_in_memory(self):
+        spool = EventSpool(self.path, max_memory_events=10)
+        spool.put(_processed_events(1, 2))
+        spool.put(_processed_events(3))
+
+        self.assertEqual(len(spool), 3)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        events, receipt = spool.peek(100)
+        self.assertEqual(events, _processed_events(1, 2, 3))
+        self.assertEqual(spool.peek(100)[0], events)
+
+        spool.commit(receipt)
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(spool.peek(100), ([], None))
+
+    def test_peek_returns_at_least_one_batch(self):
+        spool = EventSpool(self.path, max_memory_events=10)
+        spool.put(_processed_events(1, 2, 3))
+        spool.put(_processed_events(4))
+
+        events, receipt = spool.peek(2)
+        self.assertEqual(events, _processed_events(1, 2, 3))
+        spool.commit(receipt)
+        self.assertEqual(spool.peek(2)[0], _processed_events(4))
+
+    def test_overflow_keeps_the_fetch_order(self):
+        spool = EventSpool(self.path, max_memory_events=2)
+        spool.put(_processed_events(1, 2))
+        spool.put(_processed_events(3))
+        # Once batches are on disk, further batches follow them there even if memory is free again
+        events, receipt = spool.peek(100)
+        spool.commit(receipt)
+        spool.put(_processed_events(4))
+
+        self.assertEqual(events, _processed_events(1, 2))
+        self.assertEqual(len(spool), 2)
+        self.assertEqual(self._drain(spool, max_events=1), _processed_events(3, 4))
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_no_memory_spools_every_batch(self):
+        spool = EventSpool(self.path, max_memory_events=0)
+        spool.put(_processed_events(1))
+
+        self.assertGreater(os.path.getsize(self.path), 0)
+        self.assertEqual(len(EventSpool(self.path, max_memory_events=0)), 1)
+
+    def test_reopened_spool_replays_unwritten_batches(self):
+        spool = EventSpool(self.path, max_memory_events=0)
+        for event_id in (1, 2, 3):
+            spool.put(_processed_events(event_id))
+        _, receipt = spool.peek(1)
+        spool.commit(receipt)
+
+        reopened = EventSpool(self.path, max_memory_events=0)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(self._drain(reopened), _processed_events(2, 3))
+
+    def test_spill_moves_memory_ahead_of_the_file(self):
+        spool = EventSpool(self.path, max_memory_events=2)
+        spool.put(_processed_events(1, 2))
+        spool.put(_processed_events(3))
+
+        spool.spill()
+
+        self.assertEqual(len(spool), 3)
+        self.assertEqual(self._drain(EventSpool(self.path)), _processed_events(1, 2, 3))
+
+    def test_spill_of_a_partly_written_file(self):
+        spool = EventSpool(self.path, max_memory_events=1)
+        spool.put(_processed_events(1))
+        spool.put(_processed_events(2))
+        spool.put(_processed_events(3))
+        _, receipt = spool.peek(1)
+        spool.commit(receipt)
+        _, receipt = spool.peek(1)
+        spool.commit(receipt)
+        spool.put(_processed_events(4))
+
+        spool.spill()
+
+        self.assertEqual(self._drain(EventSpool(self.path)), _processed_events(3, 4))
+
+    def test_partial_last_batch_is_dropped(self):
+        spool = EventSpool(self.path, max_memory_events=0)
+        spool.put(_processed_events(1))
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as file:
+            file.write(b'[[2, "WatchEvent"')
+
+        reopened = EventSpool(self.path, max_memory_events=0)
+
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertEqual(len(reopened), 1)
+        reopened.put(_processed_events(3))
+        self.assertEqual(self._drain(reopened), _processed_events(1, 3))
+
+    def test_offset_beyond_the_file_is_reset(self):
+        spool = EventSpool(self.path, max_memory_events=0)
+        spool.put(_processed_events(1))
+        with open(spool.offset_path, 'w') as file:
+            file.write(str(os.path.getsize(self.path) + 100))
+
+        reopened = EventSpool(self.path, max_memory_events=0)
+
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(self._drain(reopened), _processed_events(1))
+
+
+@override_settings(CACHES=LOCAL_MEMORY_CACHES)
+class RecentCountsTests(TestCase):
+    """
+    Tests of the `RecentCounts` ring buffer, its published snapshot and its invalidation.
+    """
+
+    def setUp(self):
+        cache.clear()
+        _reset_parser()
+        self.addCleanup(_reset_parser)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def test_ring_keeps_the_newest_minute_of_a_slot(self):
+        recent_counts = RecentCounts(1)
+        recent_counts.add(self.now - timedelta(minutes=60), 'WatchEvent', 5)
+        recent_counts.add(self.now, 'WatchEvent')
+        # The slot of the current minute now belongs to it, older events of the slot are ignored
+        recent_counts.add(self.now - timedelta(minutes=60), 'WatchEvent', 5)
+        recent_counts.add(self.now - timedelta(minutes=1), 'PullRequestEvent', 2)
+        recent_counts.publish()
+
+        self.assertEqual(
+            RecentCounts.count_since(self.now - timedelta(minutes=58), self.now),
+            {'WatchEvent': 1, 'PullRequestEvent': 2}
+        )
+
+    def test_snapshot_only_answers_covered_windows(self):
+        recent_counts = RecentCounts(1)
+        recent_counts.add(self.now, 'WatchEvent')
+        recent_counts.publish()
+
+        # The snapshot covers the last 60 minutes, including the current one
+        self.assertEqual(RecentCounts.count_since(self.now - timedelta(minutes=58), self.now), {'WatchEvent': 1})
+        self.assertIsNone(RecentCounts.count_since(self.now - timedelta(minutes=61), self.now))
+        self.assertEqual(asyncio.run(RecentCounts.acount_since(self.now, self.now)), {'WatchEvent': 1})
+
+    def test_old_snapshot_is_ignored(self):
+        RecentCounts(1).publish()
+
+        later = timezone.now() + RecentCounts.MAX_SNAPSHOT_AGE + timedelta(seconds=1)
+        self.assertIsNone(RecentCounts.count_since(later - timedelta(minutes=1), later))
+
+    def test_invalidate_removes_the_snapshot_of_recent_events_only(self):
+        recent_counts = RecentCounts(settings.RECENT_COUNTS_HOURS)
+        recent_counts.publish()
+
+        RecentCounts.invalidate(self.now - timedelta(hours=settings.RECENT_COUNTS_HOURS, minutes=1))
+        self.assertFalse(recent_counts.is_invalidated())
+        self.assertIsNotNone(RecentCounts.count_since(self.now, self.now))
+
+        RecentCounts.invalidate(self.now)
+        self.assertTrue(recent_counts.is_invalidated())
+        self.assertIsNone(RecentCounts.count_since(self.now, self.now))
+        self.assertFalse(RecentCounts(settings.RECENT_COUNTS_HOURS).is_invalidated())
+
+    def test_parser_reloads_an_invalidated_buffer(self):
+        GHParser.recent_counts = RecentCounts.from_database(settings.RECENT_COUNTS_HOURS)
+        GHParser.save_events([(1, EventTypes.WatchEvent, 1, 'owner/repo-1', self.now)])
+
+        # Saved by another process, which has no buffer
+        GHParser.recent_counts, parser_counts = None, GHParser.recent_counts
+        GHParser.save_events([(2, EventTypes.WatchEvent, 1, 'owner/repo-1', self.now)])
+        self.assertIsNone(RecentCounts.count_since(self.now, self.now))
+
+        GHParser.recent_counts = parser_counts
+        GHParser.save_events([(3, EventTypes.PullRequestEvent, 1, 'owner/repo-1', self.now)])
+
+        self.assertIsNot(GHParser.recent_counts, parser_counts)
+        self.assertEqual(
+            RecentCounts.count_since(self.now, self.now),
+            {'WatchEvent': 2, 'PullRequestEvent': 1}
+        )
+
+
+@override_settings(CACHES=LOCAL_MEMORY_CACHES)
+class CachedResponseTests(TestCase):
+    """
+    Tests of the metrics responses validated by the ingest watermark and cached in the shared cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        _reset_parser()
+        self.addCleanup(_reset_parser)
+        # A replica connection would not see the events saved within the transaction of the test
+        replica_available = mock.patch('checker.routers.replica_available', return_value=False)
+        replica_available.start()
+        self.addCleanup(replica_available.stop)
+        created_at = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        GHParser.save_events([
+            (1, EventTypes.PullRequestEvent, 1, 'owner/repo-1', created_at),
+            (2, EventTypes.PullRequestEvent, 1, 'owner/repo-1', created_at + timedelta(hours=2)),
+        ])
+        self.url = '/metrics/pull-request/1'
+
+    def test_matching_etag_is_not_modified(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(queries), 0)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_cached_response_runs_no_query(self):
+        response = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(json.loads(cached.content)['average_time'], '0 days, 02:00:00')
+
+    def test_new_events_change_the_response(self):
+        response = self.client.get(self.url)
+        GHParser.save_events([
+            (3, EventTypes.PullRequestEvent, 1, 'owner/repo-1', datetime(2024, 1, 1, 6, tzinfo=dt_timezone.utc))
+        ])
+
+        updated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], response['ETag'])
+        self.assertEqual(json.loads(updated.content)['average_time'], '0 days, 03:00:00')
+
+    def test_errors_are_neither_validated_nor_cached(self):
+        response = self.client.get('/metrics/pull-request/2')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Cache-Control', response)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            self.client.get('/metrics/pull-request/2')
+        self.assertGreater(len(queries), 0)
+
+    def test_expired_repository_watermark_falls_back_to_the_overall_watermark(self):
+        cache.delete(IngestWatermark._repository_key(1))
+
+        response = self.client.get(self.url)
+
+        self.assertIn('ETag', response)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class TokenPoolTests(TestCase):
+    """
+    Tests of the rate limit state kept by `TokenPool`.
+    """
+
+    @staticmethod
+    def _headers(remaining: int, reset: float):
+        return {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(int(reset))}
+
+    def test_requires_a_token(self):
+        with self.assertRaises(ValueError):
+            TokenPool([])
+
+    def test_tokens_with_unknown_limits_are_used_first(self):
+        pool = TokenPool(['first', 'second'])
+        self.assertEqual(pool.acquire(), 'first')
+        pool.update('first', self._headers(100, time.time() + 3600))
+
+        self.assertEqual(pool.acquire(), 'second')
+
+    def test_token_with_the_most_remaining_requests_is_used(self):
+        pool = TokenPool(['first', 'second'])
+        reset = time.time() + 3600
+        pool.update('first', self._headers(2, reset))
+        pool.update('second', self._headers(3, reset))
+
+        # Every acquired request is reserved until its response reports the new limit
+        self.assertEqual([pool.acquire() for _ in range(4)], ['second', 'first', 'second', 'first'])
+        self.assertEqual(pool.remaining(), 1)
+
+    def test_out_of_order_responses_do_not_raise_the_limit(self):
+        pool = TokenPool(['token'])
+        reset = time.time() + 3600
+        pool.update('token', self._headers(10, reset))
+        pool.update('token', self._headers(12, reset))
+
+        self.assertEqual(pool.remaining(), 10)
+
+    def test_exhausted_token_is_skipped_until_its_reset(self):
+        pool = TokenPool(['first', 'second'])
+        pool.update('first', self._headers(100, time.time() + 3600))
+        pool.update('second', self._headers(0, time.time() + 3600))
+        pool.mark_exhausted('first')
+
+        self.assertIsNone(pool.acquire())
+
+        pool.update('second', self._headers(0, time.time() - 1))
+        self.assertEqual(pool.acquire(), 'second')
+
+    def test_exhausted_token_without_reset_time_is_skipped_for_a_while(self):
+        pool = TokenPool(['token'])
+        pool.mark_exhausted('token')
+
+        self.assertIsNone(pool.acquire())
+        self.assertGreater(pool.next_delay(), TokenPool.DEFAULT_RESET_DELAY - 5)
+
+    def test_next_delay_spreads_the_remaining_requests_until_the_reset(self):
+        pool = TokenPool(['first', 'second'])
+        self.assertEqual(pool.next_delay(), 0)
+
+        reset = time.time() + 1000
+        pool.update('first', self._headers(60, reset))
+        pool.update('second', self._headers(60, reset))
+
+        # 2 tokens x 10 requests above the reserve within 1000 seconds
+        self.assertAlmostEqual(pool.next_delay(reserve=50), 50, delta=1)
+
+    def test_next_delay_waits_for_the_earliest_reset(self):
+        pool = TokenPool(['first', 'second'])
+        pool.update('first', self._headers(5, time.time() + 600))
+        pool.update('second', self._headers(0, time.time() + 300))
+
+        self.assertAlmostEqual(pool.next_delay(reserve=10), 300, delta=2)
+
+
+@override_settings(CACHES=LOCAL_MEMORY_CACHES)
+class SaveEventsTests(TestCase):
+    """
+    Tests of the idempotent ingestion of `GHParser.save_events`, including its rollups and statistics.
+    """
+
+    def setUp(self):
+        _reset_parser()
+        self.addCleanup(_reset_parser)
+        created_at = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.events = [
+            (1, EventTypes.PullRequestEvent, 1, 'owner/repo-1', created_at),
+            (2, EventTypes.WatchEvent, 1, 'owner/repo-1', created_at + timedelta(seconds=30)),
+            (3, EventTypes.PullRequestEvent, 1, 'owner/repo-1', created_at + timedelta(hours=1)),
+            (4, EventTypes.IssuesEvent, 2, 'owner/repo-2', created_at + timedelta(hours=1)),
+        ]
+
+    def _state(self):
+        return (
+            Event.objects.count(),
+            sorted(EventRollup.objects.values_list('minute', 'event_type__event_type', 'count')),
+            sorted(PullRequestStats.objects.values_list('repo__gh_repo_id', 'count', 'first_at', 'last_at')),
+        )
+
+    def test_saves_new_events_with_rollups_and_statistics(self):
+        self.assertEqual(GHParser.save_events(self.events + self.events[:1]), 4)
+
+        created_at = self.events[0][4]
+        self.assertEqual(self._state(), (
+            4,
+            [
+                (created_at, 'PullRequestEvent', 1),
+                (created_at, 'WatchEvent', 1),
+                (created_at + timedelta(hours=1), 'IssuesEvent', 1),
+                (created_at + timedelta(hours=1), 'PullRequestEvent', 1),
+            ],
+            [(1, 2, created_at, created_at + timedelta(hours=1))],
+        ))
+
+    def test_reingested_events_are_not_counted_again(self):
+        GHParser.save_events(self.events)
+        state = self._state()
+
+        self.assertEqual(GHParser.save_events(self.events), 0)
+        # Another process (e.g. a backfill of the same hour) does not share the recently saved IDs
+        _reset_parser()
+        self.assertEqual(GHParser.save_events(self.events), 0)
+
+        self.assertEqual(self._state(), state)
+
+    def test_events_stored_meanwhile_are_not_counted(self):
+        GHParser.save_events(self.events[:1])
+        # Stored by a concurrent writer after the batch was checked against the recently saved IDs
+        Event.objects.create(
+            gh_event_id=3,
+            event_type=EventType.objects.get(event_type='PullRequestEvent'),
+            repo=Repository.objects.get(gh_repo_id=1),
+            created_at=self.events[2][4]
+        )
+
+        self.assertEqual(GHParser.save_events(self.events), 2)
+        self.assertEqual(EventRollup.objects.aggregate(count=Sum('count'))['count'], 3)
+        self.assertEqual(PullRequestStats.objects.get(repo__gh_repo_id=1).count, 1)
+
+
+@override_settings(CACHES=LOCAL_MEMORY_CACHES)
+class EventRetentionTests(TestCase):
+    """
+    Tests of folding raw events into the hourly aggregates with `EventRetention`.
+    """
+
+    def setUp(self):
+        _reset_parser()
+        self.addCleanup(_reset_parser)
+        self.start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        event_types = [EventTypes.WatchEvent, EventTypes.PullRequestEvent] * 20
+        GHParser.save_events([
+            (event_id, event_type, event_id % 3, 'owner/repo', self.start + timedelta(minutes=7 * event_id))
+            for event_id, event_type in enumerate(event_types, start=1)
+        ])
+        self.cutoff = self.start + timedelta(hours=3)
+
+    @staticmethod
+    def _event_counts(events):
+        counts = defaultdict(int)
+        for created_at, repo_id, event_type_id in events.values_list('created_at', 'repo_id', 'event_type_id'):
+            counts[(created_at.replace(minute=0, second=0, microsecond=0), repo_id, event_type_id)] += 1
+        return dict(counts)
+
+    @staticmethod
+    def _aggregate_counts():
+        return {
+            (hour, repo_id, event_type_id): count
+            for hour, repo_id, event_type_id, count in EventHourlyAggregate.objects.values_list(
+                'hour', 'repo_id', 'event_type_id', 'count'
+            )
+        }
+
+    def test_folded_counts_equal_the_deleted_events(self):
+        expected = self._event_counts(Event.objects.filter(created_at__lt=self.cutoff))
+        kept = Event.objects.filter(created_at__gte=self.cutoff).count()
+
+        deleted, position, batches = 0, None, 0
+        while True:
+            batch_deleted, position = EventRetention.fold_batch(self.cutoff, position, batch_size=4)
+            if not batch_deleted:
+                break
+            deleted += batch_deleted
+            batches += 1
+
+        self.assertEqual(deleted, sum(expected.values()))
+        self.assertEqual(batches, math.ceil(deleted / 4))
+        self.assertEqual(Event.objects.count(), kept)
+        self.assertFalse(Event.objects.filter(created_at__lt=self.cutoff).exists())
+        self.assertEqual(self._aggregate_counts(), expected)
+
+    def test_fold_adds_to_existing_aggregates(self):
+        events = Event.objects.filter(created_at__lt=self.cutoff)
+        counts = self._event_counts(events)
+
+        self.assertEqual(EventRetention.fold(events), sum(counts.values()))
+        self.assertEqual(EventRetention.fold(events), sum(counts.values()))
+
+        self.assertEqual(self._aggregate_counts(), {key: 2 * count for key, count in counts.items()})
+        self.assertEqual(events.count(), sum(counts.values()))
@@ -1,10 +1,15 @@
 from django.urls import path
 
-from .views import pull_request_metrics, events_metrics, events_metrics_visualization
+from .views import pull_request_metrics, pull_request_metrics_batch, events_metrics, events_time_series, \
+    events_export, events_metrics_visualization, internal_metrics
 
 
 urlpatterns = [
     path('metrics/pull-request/<int:repo>', pull_request_metrics),
+    path('metrics/pull-request/batch', pull_request_metrics_batch),
     path('metrics/events/<int:offset>', events_metrics),
+    path('metrics/events/time-series', events_time_series),
+    path('events/export', events_export),
     path('metrics/events_visualization/<int:offset>', events_metrics_visualization),
+    path('internal/metrics', internal_metrics),
 ]
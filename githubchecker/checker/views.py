@@ -1,54 +1,330 @@
-from django.http import HttpResponse, JsonResponse
+import hashlib
 
-from .utils import Visualizer, Analyzer
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
 
+from .charts import CONTENT_TYPES
+from .analytics import Analyzer, NotInDataBase
+from .export import EventExport
+from .ingest_state import IngestWatermark
+from .instrumentation import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from .routers import REPLICA_DATABASE, replica_replayed, track_reads
+from .visualization import Visualizer, ChartRenderTimeout
 
-def pull_request_metrics(request, repo: int):
+RESPONSE_CACHE_TIMEOUT = 60 * 60  # Seconds
+BATCH_MAX_REPOSITORIES = 1000
+TIME_SERIES_CONTENT_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+async def _cached_response(request, cache_key: str, watermark, build_response, minute_aligned: bool = False):
+    """
+    Returns a response validated by the ingest watermark and cached in the shared cache.
+
+    A response can only change when new events are ingested (and, for time windows ending now, when
+    a new minute starts), so the ETag is derived from the endpoint arguments and the watermark.
+    A matching `If-None-Match` (or `If-Modified-Since`) request is answered with `304 Not Modified`
+    without running any query; otherwise the response is served from the cache or built and cached.
+    Only successful responses are cached and get validators, so an error (e.g. a chart render timeout)
+    is not reused by clients or proxies.
+    If the watermark is unknown, or the response was built from a read replica that had not replayed the
+    ingest of the watermark yet, the response is returned without validators and is not cached, as it
+    may be older than the watermark.
+
+    :param request: The incoming HTTP request.
+    :param cache_key: The key identifying the endpoint and its arguments.
+    :param watermark: The UNIX timestamp of the last ingest affecting the response, or None.
+    :param build_response: A coroutine function returning the response.
+    :param minute_aligned: Whether the response also changes when a new minute starts.
+    :return: The HttpResponse.
+    """
+    if watermark is None:
+        return await build_response()
+
+    last_modified = watermark
+    if minute_aligned:
+        last_modified = max(watermark, timezone.now().replace(second=0, microsecond=0).timestamp())
+    etag = quote_etag(hashlib.md5(f'{cache_key}:{last_modified}'.encode()).hexdigest())
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is None:
+        response_cache_key = f'checker:response:{etag}'
+        cached = await cache.aget(response_cache_key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            with track_reads() as databases:
+                response = await build_response()
+            if REPLICA_DATABASE in databases and not replica_replayed(watermark):
+                return response
+            if response.status_code == 200:
+                await cache.aset(
+                    response_cache_key, (response.content, response['Content-Type']), RESPONSE_CACHE_TIMEOUT
+                )
+
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(int(last_modified))
+        patch_cache_control(response, max_age=settings.METRICS_MAX_AGE)
+    return response
+
+
+async def pull_request_metrics(request, repo: int):
     """
     API view for fetching pull request metrics for a specific repository.
 
     This view calculates the average time for 'PullRequestEvent' type events
     associated with the specified GitHub repository and returns it as a JSON response.
+    With `?stats=full` the distribution of the times (median, p90, p99, stddev, min, max)
+    is returned as 'interval_stats' as well.
+    The response is validated by the ingest watermark of the repository (or the overall watermark if it expired).
 
     :param request: The incoming HTTP request.
     :param repo: The ID of the GitHub repository for which to fetch metrics.
-    :return: JsonResponse containing the 'github_repository_id' and 'average_time' for pull requests.
+    :return: JsonResponse containing the 'github_repository_id' and 'average_time' for pull requests,
+             a 404 JSON response with the error message as 'average_time' if the repository does not exist,
+             or a 400 response if the stats mode is invalid.
     """
-    average_time = Analyzer.get_average_pull_request(repo)
-    response_data = {
-        'github_repository_id': repo,
-        'average_time': average_time
-    }
-    return JsonResponse(response_data)
+    stats = request.GET.get('stats')
+    if stats not in (None, 'full'):
+        return HttpResponseBadRequest('Unsupported stats mode. Usage: stats=full')
 
+    async def build_response():
+        average_time = await Analyzer.aget_average_pull_request(repo)
+        if isinstance(average_time, NotInDataBase):
+            return JsonResponse({'github_repository_id': repo, 'average_time': str(average_time)}, status=404)
+        response_data = {
+            'github_repository_id': repo,
+            'average_time': average_time
+        }
+        if stats == 'full':
+            response_data['interval_stats'] = await Analyzer.aget_pull_request_interval_stats(repo)
+        return JsonResponse(response_data)
 
-def events_metrics(request, offset: int):
+    watermark = await IngestWatermark.aget_for_repository(repo)
+    return await _cached_response(request, f'pull-request:{repo}:{stats}', watermark, build_response)
+
+
+async def pull_request_metrics_batch(request):
+    """
+    API view for fetching pull request metrics for several repositories at once.
+
+    The GitHub repository IDs are passed as a comma-separated list, e.g. `?repos=1,2,3`.
+    The average times of all repositories are computed by one database query.
+    The response is validated by the ingest watermark.
+
+    :param request: The incoming HTTP request.
+    :return: JsonResponse containing a list of 'github_repository_id' and 'average_time' pairs
+             in the requested order, or a 400 response if the list is invalid.
+    """
+    try:
+        repository_ids = list(dict.fromkeys(int(repo) for repo in request.GET.get('repos', '').split(',')))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid repository IDs. Usage: repos=<id>,<id>,...')
+    if len(repository_ids) > BATCH_MAX_REPOSITORIES:
+        return HttpResponseBadRequest(f'At most {BATCH_MAX_REPOSITORIES} repositories are allowed per request.')
+
+    async def build_response():
+        average_times = await Analyzer.aget_average_pull_requests(repository_ids)
+        response_data = {
+            'pull_request_metrics': [
+                {'github_repository_id': repo, 'average_time': average_time}
+                for repo, average_time in average_times.items()
+            ]
+        }
+        return JsonResponse(response_data)
+
+    cache_key = f'pull-request-batch:{",".join(map(str, repository_ids))}'
+    return await _cached_response(request, cache_key, await IngestWatermark.aget(), build_response)
+
+
+async def events_metrics(request, offset: int):
     """
     API view for getting grouped event metrics.
 
     This view returns a JSON response containing the count of different event
     types created within the specified offset (gap time) in minutes.
+    The response is validated by the ingest watermark and the current minute.
 
     :param request: The incoming HTTP request.
     :param offset: The gap time in minutes to consider for fetching the events metrics.
     :return: JsonResponse containing the counts of different event types.
     """
-    response_data = Analyzer.get_number_of_events_groupped(offset)
-    return JsonResponse(response_data)
+    async def build_response():
+        response_data = await Analyzer.aget_number_of_events_groupped(offset)
+        return JsonResponse(response_data)
+
+    watermark = await IngestWatermark.aget()
+    return await _cached_response(request, f'events:{offset}', watermark, build_response, minute_aligned=True)
+
+
+def _parse_datetime_argument(value):
+    """
+    Parses an ISO 8601 datetime query argument, treating naive datetimes as being in the current time zone.
+
+    :param value: The value of the query argument.
+    :raises ValueError: If the value is not a valid datetime.
+    :return: The aware datetime.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid datetime: {value}')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
 
 
-def events_metrics_visualization(request, offset: int):
+def events_time_series(request):
+    """
+    API view for getting the number of events per event type over time.
+
+    This view counts the events of every event type per time bucket within a time range and streams the
+    buckets in chronological order. The query arguments are:
+    - start: The start of the time range as an ISO 8601 datetime (inclusive, required).
+    - end: The end of the time range as an ISO 8601 datetime (exclusive, defaults to now).
+    - bucket: The bucket size, `minute`, `hour` (default) or `day`.
+    - repo: The GitHub repository ID to count the events of (defaults to all repositories).
+    - format: `json` (default) for a JSON array or `ndjson` for one JSON object per line.
+    Under ASGI the buckets are streamed by an asynchronous generator, since Django would read a
+    synchronous one completely before sending it.
+
+    :param request: The incoming HTTP request.
+    :return: StreamingHttpResponse containing the 'bucket' start times and the 'counts' of the event types,
+             or a 400 response if the arguments are invalid.
+    """
+    try:
+        start = _parse_datetime_argument(request.GET.get('start', ''))
+        end = _parse_datetime_argument(request.GET['end']) if 'end' in request.GET else timezone.now()
+        repo = int(request.GET['repo']) if 'repo' in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid arguments. Usage: start=<datetime>[&end=<datetime>][&repo=<id>]')
+    if start >= end:
+        return HttpResponseBadRequest('The start has to be before the end.')
+    bucket = request.GET.get('bucket', 'hour')
+    if bucket not in Analyzer.TIME_SERIES_BUCKETS:
+        return HttpResponseBadRequest(f'Unsupported bucket. Usage: bucket={"|".join(Analyzer.TIME_SERIES_BUCKETS)}')
+    output_format = request.GET.get('format', 'json')
+    if output_format not in TIME_SERIES_CONTENT_TYPES:
+        return HttpResponseBadRequest(f'Unsupported format. Usage: format={"|".join(TIME_SERIES_CONTENT_TYPES)}')
+
+    encoder = DjangoJSONEncoder()
+
+    def encode(point, index):
+        if output_format == 'ndjson':
+            return encoder.encode(point) + '\n'
+        return (',' if index else '[') + encoder.encode(point)
+
+    def stream():
+        index = 0
+        for point in Analyzer.get_events_time_series(start, end, bucket, repo):
+            yield encode(point, index)
+            index += 1
+        if output_format == 'json':
+            yield ']' if index else '[]'
+
+    async def astream():
+        index = 0
+        async for point in Analyzer.aget_events_time_series(start, end, bucket, repo):
+            yield encode(point, index)
+            index += 1
+        if output_format == 'json':
+            yield ']' if index else '[]'
+
+    streaming_content = astream() if isinstance(request, ASGIRequest) else stream()
+    return StreamingHttpResponse(streaming_content, content_type=TIME_SERIES_CONTENT_TYPES[output_format])
+
+
+def events_export(request):
+    """
+    API view for exporting stored events.
+
+    This view streams the events created within a time range, each with its GitHub ID, event type,
+    repository ID, repository name and creation time, ordered by the creation time. The events are read
+    in chunks from a server-side cursor, so exports of any size use the same amount of memory.
+    The query arguments are:
+    - start: The start of the time range as an ISO 8601 datetime (inclusive, required).
+    - end: The end of the time range as an ISO 8601 datetime (exclusive, defaults to now).
+    - repo: The GitHub repository ID to export the events of (defaults to all repositories).
+    - format: `csv` (default) or `ndjson` for one JSON object per line.
+
+    :param request: The incoming HTTP request.
+    :return: StreamingHttpResponse containing the events as an attachment,
+             or a 400 response if the arguments are invalid.
+    """
+    try:
+        start = _parse_datetime_argument(request.GET.get('start', ''))
+        end = _parse_datetime_argument(request.GET['end']) if 'end' in request.GET else timezone.now()
+        repo = int(request.GET['repo']) if 'repo' in request.GET else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid arguments. Usage: start=<datetime>[&end=<datetime>][&repo=<id>]')
+    if start >= end:
+        return HttpResponseBadRequest('The start has to be before the end.')
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in EventExport.CONTENT_TYPES:
+        return HttpResponseBadRequest(f'Unsupported format. Usage: format={"|".join(EventExport.CONTENT_TYPES)}')
+
+    if isinstance(request, ASGIRequest):
+        streaming_content = EventExport.achunks(start, end, output_format, repo)
+    else:
+        streaming_content = EventExport.chunks(start, end, output_format, repo)
+    response = StreamingHttpResponse(streaming_content, content_type=EventExport.CONTENT_TYPES[output_format])
+    response['Content-Disposition'] = f'attachment; filename="events.{output_format}"'
+    return response
+
+
+async def events_metrics_visualization(request, offset: int):
     """
     API view for visualizing events metrics.
 
     This view generates a bar chart representing the number of different event
     types created within the specified offset (gap time) in minutes. The chart
-    is returned as an image in PNG format.
+    is returned as an image in PNG format, or in SVG format with `?format=svg`.
+    A smaller PNG is returned with `?size=small`.
+    The response is validated by the ingest watermark and the current minute.
 
     :param request: The incoming HTTP request.
     :param offset: The gap time in minutes to consider for generating the events metrics.
-    :return: HttpResponse containing the generated PNG image of the bar chart.
+    :return: HttpResponse containing the generated image of the bar chart,
+             or a 503 response if rendering timed out.
+    """
+    image_format = request.GET.get('format', 'png')
+    if image_format not in CONTENT_TYPES:
+        return HttpResponseBadRequest(f'Unsupported format. Usage: format={"|".join(CONTENT_TYPES)}')
+    small = request.GET.get('size') == 'small'
+
+    async def build_response():
+        try:
+            buf = await Visualizer.avisualize_events_metrics(offset, image_format, small)
+        except ChartRenderTimeout as e:
+            return HttpResponse(str(e), status=503)
+        return HttpResponse(buf, content_type=CONTENT_TYPES[image_format])
+
+    return await _cached_response(
+        request,
+        f'events-visualization:{offset}:{image_format}:{small}',
+        await IngestWatermark.aget(),
+        build_response,
+        minute_aligned=True
+    )
+
+
+def internal_metrics(request):
     """
+    API view exposing the instrumentation metrics of this process in the Prometheus text format.
 
-    buf = Visualizer.visualize_events_metrics(offset)
-    return HttpResponse(buf, content_type='image/png')
+    The metrics cover the latency and the database queries of every view, the analytics queries and
+    the chart rendering (see `checker.instrumentation`). The endpoint is meant to be scraped by
+    Prometheus, so it only answers requests from the addresses in `settings.INTERNAL_IPS`.
+
+    :param request: The incoming HTTP request.
+    :raises Http404: If the request does not come from an internal address.
+    :return: HttpResponse containing the current values of all metrics.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
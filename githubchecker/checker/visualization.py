@@ -0,0 +1,168 @@
+from asyncio import TimeoutError as AsyncTimeoutError
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+from io import BytesIO
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .analytics import Analyzer
+from .charts import render_bar_chart
+from .instrumentation import REGISTRY
+
+CHART_RENDER_SECONDS = REGISTRY.histogram(
+    'checker_chart_render_seconds', 'Duration of the chart renders by the process pool.', ('format', )
+)
+CHART_RENDERS = REGISTRY.counter(
+    'checker_chart_renders_total', 'Requested charts by result (cached, rendered or timeout).', ('result', )
+)
+
+
+class ChartRenderTimeout(Exception):
+    """
+    Exception raised when rendering a chart takes longer than allowed.
+    """
+    pass
+
+
+class Visualizer:
+    """
+    The Visualizer class provides static(!) methods for creating visual representations of event metrics.
+
+    Charts are rendered by a bounded pool of worker processes (see `checker.charts`), so rendering
+    neither shares `pyplot` state between requests nor blocks the request thread with encoding for
+    longer than `RENDER_TIMEOUT`. Rendered images are cached by the values they show, so identical
+    charts are encoded once.
+
+    Methods:
+    - visualize_events_metrics:
+        Creates a bar chart of event metrics for a specified time offset and returns it as a byte stream.
+    - avisualize_events_metrics:
+        Asynchronous version of `visualize_events_metrics`, which awaits the rendering worker without blocking.
+
+    Note: This class does not need to be instantiated, as all its methods are static.
+    """
+    RENDER_TIMEOUT = 10  # Seconds
+    RENDER_CACHE_TIMEOUT = 60 * 60  # Seconds
+
+    _executor = None
+    _executor_lock = Lock()
+
+    @staticmethod
+    def __summarize_values(data):
+        """
+        Private helper method to calculate the sum of values in the provided dictionary.
+
+        :param data: Dictionary with the data to be summarized.
+        :return: Sum of the dictionary values.
+        """
+        return sum(data.values())
+
+    @staticmethod
+    def __get_executor():
+        """
+        Returns the process pool that renders charts, creating it on first use.
+
+        Worker processes are spawned (not forked), so they do not inherit the threads and the
+        database connections of the web worker.
+
+        :return: The ProcessPoolExecutor.
+        """
+        with Visualizer._executor_lock:
+            if Visualizer._executor is None:
+                Visualizer._executor = ProcessPoolExecutor(
+                    max_workers=settings.CHART_RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return Visualizer._executor
+
+    @staticmethod
+    def visualize_events_metrics(offset: int, image_format: str = 'png', small: bool = False):
+        """
+        Creates a bar chart visualization of events metrics and returns it as a byte stream.
+
+        This method fetches the grouped events metrics for the specified offset (gap time) in
+        minutes and returns a bar chart of these metrics as a byte stream. The chart is taken from
+        the render cache if the same values have been rendered before; otherwise it is rendered by
+        the process pool and cached.
+
+        :param offset: The gap time in minutes to consider for fetching the events metrics.
+        :param image_format: The image format, 'png' or 'svg'.
+        :param small: Whether to render a smaller, low resolution PNG.
+        :raises ChartRenderTimeout: If rendering takes longer than `RENDER_TIMEOUT` seconds.
+        :return: BytesIO stream representing the image of the bar chart.
+        """
+        data = Analyzer.get_number_of_events_groupped(offset)
+        chart, cache_key = Visualizer.__events_metrics_chart(offset, data, image_format, small)
+
+        content = cache.get(cache_key)
+        if content is None:
+            future = Visualizer.__get_executor().submit(render_bar_chart, *chart)
+            try:
+                with CHART_RENDER_SECONDS.time(format=image_format):
+                    content = future.result(timeout=Visualizer.RENDER_TIMEOUT)
+            except FutureTimeoutError:
+                future.cancel()
+                CHART_RENDERS.inc(result='timeout')
+                raise ChartRenderTimeout(f'Rendering the chart took longer than {Visualizer.RENDER_TIMEOUT}s')
+            cache.set(cache_key, content, Visualizer.RENDER_CACHE_TIMEOUT)
+            CHART_RENDERS.inc(result='rendered')
+        else:
+            CHART_RENDERS.inc(result='cached')
+        return BytesIO(content)
+
+    @staticmethod
+    async def avisualize_events_metrics(offset: int, image_format: str = 'png', small: bool = False):
+        """
+        Asynchronous version of `visualize_events_metrics`.
+
+        The metrics are fetched with the async ORM and the rendering future of the process pool is awaited,
+        so the event loop keeps serving other requests while the chart is rendered.
+
+        :param offset: The gap time in minutes to consider for fetching the events metrics.
+        :param image_format: The image format, 'png' or 'svg'.
+        :param small: Whether to render a smaller, low resolution PNG.
+        :raises ChartRenderTimeout: If rendering takes longer than `RENDER_TIMEOUT` seconds.
+        :return: BytesIO stream representing the image of the bar chart.
+        """
+        data = await Analyzer.aget_number_of_events_groupped(offset)
+        chart, cache_key = Visualizer.__events_metrics_chart(offset, data, image_format, small)
+
+        content = await cache.aget(cache_key)
+        if content is None:
+            future = Visualizer.__get_executor().submit(render_bar_chart, *chart)
+            try:
+                with CHART_RENDER_SECONDS.time(format=image_format):
+                    content = await asyncio.wait_for(asyncio.wrap_future(future), timeout=Visualizer.RENDER_TIMEOUT)
+            except AsyncTimeoutError:
+                future.cancel()
+                CHART_RENDERS.inc(result='timeout')
+                raise ChartRenderTimeout(f'Rendering the chart took longer than {Visualizer.RENDER_TIMEOUT}s')
+            await cache.aset(cache_key, content, Visualizer.RENDER_CACHE_TIMEOUT)
+            CHART_RENDERS.inc(result='rendered')
+        else:
+            CHART_RENDERS.inc(result='cached')
+        return BytesIO(content)
+
+    @staticmethod
+    def __events_metrics_chart(offset: int, data, image_format: str, small: bool):
+        """
+        Prepares the arguments of `render_bar_chart` for the events metrics and their render cache key.
+
+        :param offset: The gap time in minutes the metrics were fetched for.
+        :param data: Dictionary with the counts of the event types.
+        :param image_format: The image format, 'png' or 'svg'.
+        :param small: Whether to render a smaller, low resolution PNG.
+        :return: A tuple of the `render_bar_chart` arguments and the cache key of the rendered chart.
+        """
+        data['Summarized'] = Visualizer.__summarize_values(data)
+        title = f'Created events in last {offset} minute(-s)'
+        chart = (title, list(data.keys()), list(data.values()), image_format, small)
+
+        cache_key = 'checker:chart:' + hashlib.md5(json.dumps(chart).encode()).hexdigest()
+        return chart, cache_key
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'checker.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,10 +86,34 @@ DATABASES = {
         'USER': 'postgres',
         'PASSWORD': '',
         'HOST': 'localhost',
-        'PORT': '5432'
+        'PORT': '5432',
+        # Connections are kept open between requests for this many seconds. Under ASGI every request
+        # may be served by another thread, so persistent connections would pile up per thread
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica serving the analytics queries of the metrics views and the event export
+# (see `checker.routers`). Writes always go to the primary database above
+if os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DATABASE_REPLICA_HOST'],
+        'PORT': os.environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['checker.routers.PrimaryReplicaRouter']
+
+# Number of seconds the replica may lag behind the primary. Analytics queries fall
+# back to the primary while the replica lags more, does not stream from the primary
+# (checking this requires the `pg_read_all_stats` role) or cannot be reached
+REPLICA_MAX_STALENESS = float(os.environ.get('REPLICA_MAX_STALENESS', 30))
+
+# Number of seconds between two measurements of the replica lag (per process)
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,3 +155,82 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Shared by the web workers and the parser. Set REDIS_URL to use Redis (requires
+# the `redis` package), otherwise a file-based cache is used
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+            # Random entries are culled beyond this number, which may remove the published ingest state
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+
+
+# Number of seconds clients may reuse responses of the metrics endpoints without
+# revalidating them (responses carry ETag/Last-Modified validators)
+METRICS_MAX_AGE = int(os.environ.get('METRICS_MAX_AGE', 10))
+
+# Comma-separated addresses from which the instrumentation metrics (`/internal/metrics`)
+# may be requested. Requests from other addresses are answered with 404 Not Found
+INTERNAL_IPS = [address for address in os.environ.get('INTERNAL_IPS', '127.0.0.1,::1').split(',') if address]
+
+# Number of worker processes that render charts
+CHART_RENDER_WORKERS = int(os.environ.get('CHART_RENDER_WORKERS', 2))
+
+# GitHub events parser
+# Used by `python manage.py run_parser`
+
+# Comma-separated list of GitHub API tokens. Requests are spread over all tokens
+# according to their remaining rate limit
+GITHUB_TOKENS = [token for token in os.environ.get('GITHUB_TOKENS', '').split(',') if token]
+
+GITHUB_EVENTS_URL = os.environ.get('GITHUB_EVENTS_URL', 'https://api.github.com/events')
+
+# Minimal number of seconds between two polls. The parser also follows the poll
+# interval and the rate limit reported by GitHub, so it may poll slower than this
+PARSER_MIN_INTERVAL = float(os.environ.get('PARSER_MIN_INTERVAL', 12))
+
+# Number of hours of event counts the parser keeps in memory and publishes to
+# the cache. Time window counts within these hours are answered without a query
+RECENT_COUNTS_HOURS = int(os.environ.get('RECENT_COUNTS_HOURS', 24))
+
+# Number of seconds the parser keeps its database connection open between batches
+PARSER_CONN_MAX_AGE = int(os.environ.get('PARSER_CONN_MAX_AGE', 60))
+
+# Port on which the parser serves its instrumentation metrics in the Prometheus
+# text format. The metrics are not served if it is not set
+PARSER_METRICS_PORT = int(os.environ['PARSER_METRICS_PORT']) if os.environ.get('PARSER_METRICS_PORT') else None
+
+# Address on which the parser serves its instrumentation metrics. Set it to `0.0.0.0`
+# only if the port is not reachable from outside (e.g. it is only exposed to the scraper)
+PARSER_METRICS_ADDRESS = os.environ.get('PARSER_METRICS_ADDRESS', '127.0.0.1')
+
+# File to which the parser spools fetched events that are not written yet. Events
+# left in it (e.g. while the database was unavailable) are written on the next start
+PARSER_SPOOL_PATH = os.environ.get('PARSER_SPOOL_PATH', str(BASE_DIR / 'parser-spool.ndjson'))
+
+# Number of fetched events the parser keeps in memory before it spools them to the
+# spool file, and the maximal number of events it saves in one transaction
+PARSER_MAX_MEMORY_EVENTS = int(os.environ.get('PARSER_MAX_MEMORY_EVENTS', 10000))
+PARSER_WRITE_BATCH_EVENTS = int(os.environ.get('PARSER_WRITE_BATCH_EVENTS', 5000))
+
+
+# Event storage
+# Number of days after which raw events are folded into hourly aggregates and deleted
+# by `python manage.py apply_retention` (or `python manage.py event_partitions drop-expired`)
+
+EVENT_RETENTION_DAYS = int(os.environ.get('EVENT_RETENTION_DAYS', 90))
@@ -16,21 +16,6 @@ def main():
             "forget to activate a virtual environment?"
         ) from exc
     execute_from_command_line(sys.argv)
-    from checker.utils import GHParser
-    import time
-
-    # Parser start
-    TOKEN = '<TOKEN>'  # Put here your token
-    ACTIVE_PARSER = False  # Change if you (don't) want to activate parser
-
-    # Change this if you want to parse faster/slower
-    # However, do not forget about GitHub requests' limitation
-    AMOUNT_OF_REQUEST_PER_MINUT = 5
-
-    while ACTIVE_PARSER:
-        GHParser.parse(TOKEN)
-        time.sleep(60 // AMOUNT_OF_REQUEST_PER_MINUT)
-    # End
 
 
 if __name__ == '__main__':